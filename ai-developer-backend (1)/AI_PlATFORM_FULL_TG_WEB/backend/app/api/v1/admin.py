@@ -3,6 +3,8 @@ from typing import Optional
 
 from app.api.v1.deps import get_current_admin
 from app.core.database import Database
+from app.core.metrics import metrics
+from app.core.ai.router import router as provider_router
 
 router = APIRouter()
 db = Database()
@@ -29,3 +31,11 @@ async def last_requests(limit: int = 200, admin: dict = Depends(get_current_admi
 async def list_keys(user_id: Optional[int] = None, admin: dict = Depends(get_current_admin)):
     keys = await db.admin_list_api_keys(user_id=user_id)
     return {"keys": keys}
+
+@router.get("/metrics")
+async def get_metrics(admin: dict = Depends(get_current_admin)):
+    return metrics.snapshot()
+
+@router.get("/ai/providers")
+async def provider_health(admin: dict = Depends(get_current_admin)):
+    return {"providers": provider_router.snapshot()}
@@ -0,0 +1,15 @@
+from typing import Optional
+
+
+class UpstreamError(RuntimeError):
+    """A provider call failed. ``status`` is None for timeouts/transport errors."""
+
+    def __init__(self, provider: str, status: Optional[int], message: str):
+        super().__init__(f"{provider} error {status if status is not None else 'network'}: {message}")
+        self.provider = provider
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        """Worth trying elsewhere: 5xx or no response at all."""
+        return self.status is None or self.status >= 500
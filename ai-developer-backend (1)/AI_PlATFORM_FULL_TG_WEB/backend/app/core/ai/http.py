@@ -0,0 +1,53 @@
+import asyncio
+import os
+from typing import Dict
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30"))
+TIMEOUT = float(os.getenv("AI_HTTP_TIMEOUT", "90"))
+CONNECT_TIMEOUT = float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "10"))
+USE_HTTP2 = os.getenv("AI_HTTP2", "1").lower() not in ("0", "false", "no")
+
+
+class UpstreamClients:
+    """App-lifetime httpx clients, one per provider base URL.
+
+    Clients are keyed by base URL (never by API key): auth travels in
+    per-request headers, so all users of a provider share keep-alive
+    connections instead of paying TCP+TLS handshakes on every call.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, base_url: str) -> httpx.AsyncClient:
+        base = base_url.rstrip("/")
+        client = self._clients.get(base)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=USE_HTTP2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+            self._clients[base] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+
+upstream = UpstreamClients()
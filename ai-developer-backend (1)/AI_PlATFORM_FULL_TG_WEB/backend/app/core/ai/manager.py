@@ -1,10 +1,18 @@
 import os
 import time
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any, List, AsyncGenerator
 
 import httpx
 
 from app.core.database import Database
+from app.core.ai.http import upstream
+from app.core.ai.sse import iter_chat_deltas
+from app.core.ai.errors import UpstreamError
+from app.core.ai.router import router
+from app.core.cache import MISSING
+from app.core.metrics import metrics
+from app.core.security.key_cache import key_cache
 
 db = Database()
 
@@ -48,45 +56,80 @@ MODEL_PRESETS = {
     "custom": [os.getenv("CUSTOM_OAI_MODEL", "gpt-4o-mini")],
 }
 
+# Every OPENAI_COMPAT provider speaks the same chat/completions dialect.
+OPENAI_COMPAT_CAPABILITIES = {"chat": True, "stream": True, "json_mode": True}
+
+
+@dataclass(frozen=True)
+class ProviderInfo:
+    key: str
+    source: str  # "user" | "env"
+    default_model: str
+    models: List[str] = field(default_factory=list)
+    capabilities: Dict[str, bool] = field(default_factory=dict)
+
+
 class AIManager:
-    async def _get_key(self, provider: str, user_id: Optional[int]) -> Optional[str]:
-        if user_id:
-            k = await db.get_api_key(user_id, provider)
-            if k:
-                return k
-        env = OPENAI_COMPAT.get(provider, {}).get("key_env")
-        if env:
-            return os.getenv(env)
-        return None
+    async def resolve_providers(self, user_id: int) -> Dict[str, ProviderInfo]:
+        """Map every usable provider to its key, default model and capabilities.
+
+        User keys are loaded in a single query and merged over env keys;
+        user-keyed providers come first. The map is cached per user.
+        """
+        cached = key_cache.get(int(user_id), MISSING)
+        if cached is not MISSING:
+            return cached
+
+        user_keys = await db.get_api_keys(user_id)
+        user_first = sorted(OPENAI_COMPAT, key=lambda p: not user_keys.get(p))
+        providers: Dict[str, ProviderInfo] = {}
+        for p in user_first:
+            key, source = user_keys.get(p), "user"
+            if not key:
+                key, source = os.getenv(OPENAI_COMPAT[p]["key_env"]), "env"
+            if key:
+                providers[p] = ProviderInfo(
+                    key=key,
+                    source=source,
+                    default_model=DEFAULT_MODELS.get(p, "gpt-4o-mini"),
+                    models=MODEL_PRESETS.get(p, []),
+                    capabilities=OPENAI_COMPAT_CAPABILITIES,
+                )
+        key_cache.set(int(user_id), providers)
+        return providers
 
     async def list_models(self, user_id: int) -> Dict[str, Any]:
-        providers = []
-        for p in OPENAI_COMPAT.keys():
-            if await self._get_key(p, user_id):
-                providers.append(p)
+        providers = await self.resolve_providers(user_id)
         return {
-            "providers": providers,
-            "models": {p: MODEL_PRESETS.get(p, []) for p in providers},
+            "providers": list(providers),
+            "models": {p: info.models for p, info in providers.items()},
+            "capabilities": {p: info.capabilities for p, info in providers.items()},
             "note": "Можно указывать любой model строкой — если провайдер поддерживает."
         }
 
+    async def _candidates(self, user_id: int, model: Optional[str] = None) -> List[str]:
+        """Chat-capable providers: healthy before tripped, user keys before env, then fastest."""
+        providers = await self.resolve_providers(user_id)
+        chat = [(p, model or info.default_model) for p, info in providers.items() if info.capabilities.get("chat")]
+        if not chat:
+            raise ValueError("Нет доступных провайдеров: добавьте ключ в разделе 'Ключи'.")
+        ranked = [p for p, _ in router.rank(chat)]
+        return sorted(ranked, key=lambda p: providers[p].source != "user")
+
     async def _pick_provider(self, user_id: int) -> str:
-        # prefer providers with user keys
-        for p in OPENAI_COMPAT.keys():
-            if await self._get_key(p, user_id):
-                return p
-        raise ValueError("Нет доступных провайдеров: добавьте ключ в разделе 'Ключи'.")
+        return (await self._candidates(user_id))[0]
 
-    async def generate(
+    async def _prepare(
         self,
         prompt: str,
-        provider: Optional[str] = None,
-        model: Optional[str] = None,
-        temperature: float = 0.7,
-        max_tokens: int = 4000,
-        json_mode: bool = False,
-        user_id: Optional[int] = None
-    ) -> str:
+        provider: Optional[str],
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        json_mode: bool,
+        user_id: Optional[int],
+    ):
+        """Resolve provider/key and build (provider, base, headers, payload)."""
         if not user_id:
             raise ValueError("user_id required")
 
@@ -94,12 +137,13 @@ class AIManager:
         if provider == "auto":
             provider = await self._pick_provider(user_id)
 
-        key = await self._get_key(provider, user_id)
-        if not key:
+        info = (await self.resolve_providers(user_id)).get(provider)
+        if not info:
             raise ValueError(f"Нет ключа для провайдера '{provider}'")
+        key = info.key
 
         base = OPENAI_COMPAT[provider]["base"].rstrip("/")
-        model = model or DEFAULT_MODELS.get(provider, "gpt-4o-mini")
+        model = model or info.default_model
 
         headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
         if provider == "openrouter":
@@ -114,25 +158,102 @@ class AIManager:
         }
         if json_mode:
             payload["response_format"] = {"type": "json_object"}
+        return provider, base, headers, payload
+
+    async def generate(
+        self,
+        prompt: str,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        json_mode: bool = False,
+        user_id: Optional[int] = None
+    ) -> str:
+        if not user_id:
+            raise ValueError("user_id required")
+        if provider and provider != "auto":
+            candidates = [provider]
+        else:
+            candidates = await self._candidates(user_id, model)
+
+        # Auto mode fails over to the next candidate on 5xx / network errors.
+        for attempt, candidate in enumerate(candidates):
+            try:
+                return await self._generate_once(prompt, candidate, model, temperature, max_tokens, json_mode, user_id)
+            except UpstreamError as e:
+                if not e.retryable or attempt == len(candidates) - 1:
+                    raise
+                metrics.inc("ai.router.failovers")
+
+    async def _generate_once(self, prompt, provider, model, temperature, max_tokens, json_mode, user_id) -> str:
+        provider, base, headers, payload = await self._prepare(
+            prompt, provider, model, temperature, max_tokens, json_mode, user_id
+        )
 
-        t0 = time.time()
-        status = "ok"
-        try:
-            async with httpx.AsyncClient(timeout=90) as client:
-                r = await client.post(f"{base}/chat/completions", headers=headers, json=payload)
+        with router.dispatch(provider, payload["model"]):
+            t0 = time.time()
+            status = None  # stays None when cancelled or on a local error: not the provider's health
+            try:
+                try:
+                    r = await upstream.get(base).post(f"{base}/chat/completions", headers=headers, json=payload)
+                except httpx.TransportError as e:
+                    status = "err_network"
+                    raise UpstreamError(provider, None, str(e) or type(e).__name__)
                 if r.status_code != 200:
-                    status = f"err_{r.status_code}"
-                    raise RuntimeError(r.text)
+                    err = UpstreamError(provider, r.status_code, r.text)
+                    if err.retryable:  # a 4xx is the caller's key or request, not the model's health
+                        status = f"err_{r.status_code}"
+                    raise err
                 data = r.json()
                 text = data["choices"][0]["message"]["content"]
+                status = "ok"
                 return text
-        finally:
-            latency_ms = int((time.time() - t0) * 1000)
-            # usage log is handled by route; still mark last_used
-            await db.touch_api_key_last_used(user_id, provider)
-            # project-level log can be extended later
-
-    async def stream_generate(self, *args, **kwargs) -> AsyncGenerator[str, None]:
-        # Simple fallback: no real streaming; yields once.
-        text = await self.generate(*args, **kwargs)
-        yield text
+            finally:
+                latency_ms = int((time.time() - t0) * 1000)
+                if status == "ok":
+                    router.record_success(provider, payload["model"], latency_ms)
+                elif status is not None:
+                    router.record_failure(provider, payload["model"], latency_ms)
+                # usage log is handled by route; still mark last_used
+                db.touch_api_key_last_used(user_id, provider)
+                # project-level log can be extended later
+
+    async def stream_generate(
+        self,
+        prompt: str,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        json_mode: bool = False,
+        user_id: Optional[int] = None
+    ) -> AsyncGenerator[str, None]:
+        """Yield content deltas as the provider produces them (SSE, ``stream: true``)."""
+        provider, base, headers, payload = await self._prepare(
+            prompt, provider, model, temperature, max_tokens, json_mode, user_id
+        )
+        payload["stream"] = True
+
+        with router.dispatch(provider, payload["model"]):
+            t0 = time.time()
+            ttft_ms = None
+            try:
+                async with upstream.get(base).stream("POST", f"{base}/chat/completions", headers=headers, json=payload) as r:
+                    if r.status_code != 200:
+                        raise UpstreamError(provider, r.status_code, (await r.aread()).decode(errors="replace"))
+                    async for delta in iter_chat_deltas(r):
+                        if ttft_ms is None:
+                            ttft_ms = (time.time() - t0) * 1000
+                        yield delta
+            except httpx.TransportError as e:
+                router.record_failure(provider, payload["model"], (time.time() - t0) * 1000)
+                raise UpstreamError(provider, None, str(e) or type(e).__name__)
+            except UpstreamError as e:
+                if e.retryable:
+                    router.record_failure(provider, payload["model"], (time.time() - t0) * 1000)
+                raise
+            else:
+                router.record_success(provider, payload["model"], (time.time() - t0) * 1000, ttft_ms)
+            finally:
+                db.touch_api_key_last_used(user_id, provider)
@@ -0,0 +1,140 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+Key = Tuple[str, str]  # (provider, model)
+
+
+class _Stats:
+    def __init__(self, window: int):
+        self.latency_ms: Optional[float] = None
+        self.ttft_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = "closed"  # closed | open | half_open
+        self.opened_at = 0.0
+        self.probing = False
+        self.recent: Deque[float] = deque(maxlen=window)
+
+
+def _ewma(prev: Optional[float], value: float, alpha: float) -> float:
+    return value if prev is None else alpha * value + (1 - alpha) * prev
+
+
+class ProviderRouter:
+    """Latency-aware routing with per-(provider, model) circuit breakers.
+
+    Keeps an EWMA of latency, time-to-first-token and error rate per
+    (provider, model). ``failure_threshold`` consecutive failures open the
+    circuit; after ``cooldown`` seconds one probe request is let through
+    (half-open) and its outcome closes or re-opens the circuit. ``rank`` only
+    reads state; the probe slot is claimed by ``dispatch`` around the actual
+    call and freed however that call ends (cancelled, timed out, any error).
+    """
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 5, cooldown: float = 30.0, window: int = 200):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self._stats: Dict[Key, _Stats] = {}
+
+    def _get(self, provider: str, model: str) -> _Stats:
+        st = self._stats.get((provider, model))
+        if st is None:
+            st = self._stats[(provider, model)] = _Stats(self.window)
+        return st
+
+    def record_success(self, provider: str, model: str, latency_ms: float, ttft_ms: Optional[float] = None) -> None:
+        st = self._get(provider, model)
+        st.requests += 1
+        st.latency_ms = _ewma(st.latency_ms, latency_ms, self.alpha)
+        if ttft_ms is not None:
+            st.ttft_ms = _ewma(st.ttft_ms, ttft_ms, self.alpha)
+        st.error_rate = _ewma(st.error_rate, 0.0, self.alpha)
+        st.recent.append(latency_ms)
+        st.consecutive_failures = 0
+        st.state, st.probing = "closed", False
+
+    def record_failure(self, provider: str, model: str, latency_ms: float) -> None:
+        st = self._get(provider, model)
+        st.requests += 1
+        st.failures += 1
+        st.consecutive_failures += 1
+        st.error_rate = _ewma(st.error_rate, 1.0, self.alpha)
+        if st.state == "half_open" or st.consecutive_failures >= self.failure_threshold:
+            st.state, st.opened_at, st.probing = "open", time.monotonic(), False
+
+    def _probe_due(self, st: _Stats) -> bool:
+        return st.state == "half_open" or (st.state == "open" and time.monotonic() - st.opened_at >= self.cooldown)
+
+    def available(self, provider: str, model: str) -> bool:
+        """Closed, or due a half-open probe that nobody has claimed yet. No side effects."""
+        st = self._stats.get((provider, model))
+        if st is None or st.state == "closed":
+            return True
+        return self._probe_due(st) and not st.probing
+
+    @contextmanager
+    def dispatch(self, provider: str, model: str) -> Iterator[None]:
+        """Wrap one upstream call: claims the half-open probe slot if the circuit is due one."""
+        st = self._stats.get((provider, model))
+        claimed = False
+        if st is not None and st.state != "closed" and not st.probing and self._probe_due(st):
+            st.state, st.probing, claimed = "half_open", True, True
+        try:
+            yield
+        finally:
+            if claimed:
+                st.probing = False
+
+    def expected_latency(self, provider: str, model: str) -> float:
+        """EWMA latency, inflated by error rate; unseen pairs rank first so they get measured,
+        pairs that have only ever failed rank last."""
+        st = self._stats.get((provider, model))
+        if st is None or st.requests == 0:
+            return 0.0
+        if st.latency_ms is None:
+            return float("inf")
+        return st.latency_ms / max(1e-3, 1.0 - st.error_rate)
+
+    def p95(self, provider: str, model: str) -> Optional[float]:
+        st = self._stats.get((provider, model))
+        if st is None or not st.recent:
+            return None
+        ordered = sorted(st.recent)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def rank(self, candidates: List[Key]) -> List[Key]:
+        """Healthy candidates, fastest first; all of them if every circuit is open."""
+        healthy = [c for c in candidates if self.available(*c)]
+        return sorted(healthy or candidates, key=lambda c: self.expected_latency(*c))
+
+    def snapshot(self) -> List[Dict]:
+        return [
+            {
+                "provider": provider,
+                "model": model,
+                "state": st.state,
+                "latency_ms": st.latency_ms,
+                "ttft_ms": st.ttft_ms,
+                "p95_ms": self.p95(provider, model),
+                "error_rate": st.error_rate,
+                "requests": st.requests,
+                "failures": st.failures,
+                "consecutive_failures": st.consecutive_failures,
+            }
+            for (provider, model), st in sorted(self._stats.items())
+        ]
+
+
+# Provider health per (provider, model); see GET /admin/ai/providers.
+router = ProviderRouter(
+    alpha=float(os.getenv("AI_ROUTER_EWMA_ALPHA", "0.2")),
+    failure_threshold=int(os.getenv("AI_ROUTER_FAILURE_THRESHOLD", "5")),
+    cooldown=float(os.getenv("AI_ROUTER_COOLDOWN", "30")),
+)
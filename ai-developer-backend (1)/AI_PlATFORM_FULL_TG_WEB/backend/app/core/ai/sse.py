@@ -0,0 +1,53 @@
+import json
+from typing import AsyncGenerator, AsyncIterator
+
+import httpx
+
+
+async def iter_sse_data(lines: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """Yield the ``data`` payload of each server-sent event.
+
+    An event ends at a blank line (or the end of the stream); its ``data:``
+    lines are joined with newlines, one leading space after the colon is
+    dropped. Comments (``:keep-alive``) and other fields are skipped. Lines
+    arrive already split, so CRLF and lines cut across network chunks are
+    the line decoder's job (``httpx.Response.aiter_lines``).
+    """
+    data = []
+    async for line in lines:
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        field, _, value = line.partition(":")
+        if field != "data":
+            continue
+        data.append(value[1:] if value.startswith(" ") else value)
+    if data:
+        yield "\n".join(data)
+
+
+async def iter_chat_deltas(response: httpx.Response) -> AsyncGenerator[str, None]:
+    """Yield content deltas from an OpenAI-style ``text/event-stream`` response.
+
+    Each event's data holds a ``chat.completion.chunk``; the stream ends
+    with ``data: [DONE]``. Whatever follows it is read and discarded: httpx
+    only returns a connection to the pool once its body is fully read.
+    """
+    lines = response.aiter_lines()
+    async for data in iter_sse_data(lines):
+        data = data.strip()
+        if not data:
+            continue
+        if data == "[DONE]":
+            async for _ in lines:
+                pass
+            break
+        chunk = json.loads(data)
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        content = (choices[0].get("delta") or {}).get("content")
+        if content:
+            yield content
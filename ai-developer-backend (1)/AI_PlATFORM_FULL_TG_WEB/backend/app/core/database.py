@@ -1,14 +1,16 @@
 import os
 from typing import Optional, Dict, List
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import select, update, delete, func, bindparam
 
 from app.models.db_models import Base, User, APIKey, Project, ProjectLog, Usage, Reminder, Notification, CalendarEvent
 from app.core.security.auth import hash_password, verify_password
 from app.core.security.encryption import encrypt_key, decrypt_key
+from app.core.security.key_cache import key_cache
+from app.core.writebehind import CoalescingBuffer
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -19,6 +21,28 @@ ASYNC_DB_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 engine = create_async_engine(ASYNC_DB_URL, echo=False, future=True)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+
+async def _flush_last_used(batch: Dict) -> None:
+    """Apply buffered (user_id, provider) -> last_used touches in one executemany UPDATE."""
+    keys = APIKey.__table__
+    stmt = (
+        update(keys)
+        .where(keys.c.user_id == bindparam("b_user_id"), keys.c.provider == bindparam("b_provider"))
+        .values(last_used=bindparam("b_last_used"))
+    )
+    params = [
+        {"b_user_id": user_id, "b_provider": provider, "b_last_used": ts}
+        for (user_id, provider), ts in batch.items()
+    ]
+    async with AsyncSessionLocal() as session:
+        await session.execute(stmt, params)
+        await session.commit()
+
+
+last_used_buffer = CoalescingBuffer(
+    "api_keys.last_used", _flush_last_used, float(os.getenv("LAST_USED_FLUSH_INTERVAL", "10"))
+)
+
 class Database:
     # ---------- Users ----------
     async def create_user(self, email: str, password: str, full_name: str = "") -> int:
@@ -102,6 +126,7 @@ class Database:
             key_entry = APIKey(user_id=user_id, provider=provider, encrypted_key=encrypted)
             session.add(key_entry)
             await session.commit()
+        key_cache.pop(int(user_id))
 
     async def get_api_key(self, user_id: int, provider: str) -> Optional[str]:
         async with AsyncSessionLocal() as session:
@@ -110,11 +135,21 @@ class Database:
             )
             key_entry = result.scalar_one_or_none()
             if key_entry:
-                key_entry.last_used = func.now()
-                await session.commit()
                 return decrypt_key(key_entry.encrypted_key)
             return None
 
+    async def get_api_keys(self, user_id: int) -> Dict[str, str]:
+        """All of a user's decrypted keys as provider -> key, in one query."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(APIKey.provider, APIKey.encrypted_key).where(APIKey.user_id == user_id)
+            )
+            return {provider: decrypt_key(encrypted) for provider, encrypted in result.all()}
+
+    def touch_api_key_last_used(self, user_id: int, provider: str):
+        """Record key usage; persisted in bulk by ``last_used_buffer``."""
+        last_used_buffer.put((int(user_id), provider), datetime.now(timezone.utc))
+
     async def list_api_keys(self, user_id: int) -> List[Dict]:
         async with AsyncSessionLocal() as session:
             result = await session.execute(
@@ -136,6 +171,7 @@ class Database:
                 delete(APIKey).where(APIKey.user_id == user_id, APIKey.provider == provider)
             )
             await session.commit()
+        key_cache.pop(int(user_id))
 
     # ---------- Projects ----------
     async def create_project(self, user_id: int, config: dict) -> int:
@@ -388,12 +424,3 @@ async def get_user_by_telegram_id(self, telegram_id: str) -> Optional[Dict]:
             "is_active": u.is_active,
             "settings": u.settings,
         }
-
-
-async def touch_api_key_last_used(self, user_id: int, provider: str):
-    async with AsyncSessionLocal() as session:
-        await session.execute(
-            update(APIKey).where(APIKey.user_id == user_id, APIKey.provider == provider).values(last_used=func.now())
-        )
-        await session.commit()
-
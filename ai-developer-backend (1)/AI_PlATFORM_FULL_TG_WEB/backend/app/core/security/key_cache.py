@@ -0,0 +1,11 @@
+import os
+
+from app.core.cache import TTLCache
+
+# Per-user provider map (decrypted keys + defaults) keyed by user_id.
+# Dropped explicitly when a user saves or deletes a key; other workers
+# pick up the change once the short TTL expires.
+key_cache = TTLCache(
+    maxsize=int(os.getenv("KEY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("KEY_CACHE_TTL", "60")),
+)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingBuffer:
+    """Write-behind buffer that keeps only the latest value per key.
+
+    Values are flushed in one batch every ``interval`` seconds and on
+    shutdown. A failed flush puts the batch back (without overwriting newer
+    values) so the next run retries it.
+    """
+
+    def __init__(self, name: str, flush: Callable[[Dict[Hashable, Any]], Awaitable[None]], interval: float):
+        self.name = name
+        self.interval = interval
+        self._flush = flush
+        self._pending: Dict[Hashable, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._pending[key] = value
+        metrics.set_gauge(f"{self.name}.buffer_size", len(self._pending))
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        t0 = time.perf_counter()
+        try:
+            await self._flush(batch)
+        except Exception as e:
+            logger.warning("%s flush of %d rows failed: %s", self.name, len(batch), e)
+            metrics.inc(f"{self.name}.flush_errors")
+            for key, value in batch.items():
+                self._pending.setdefault(key, value)
+        else:
+            metrics.inc(f"{self.name}.flushed_rows", len(batch))
+        finally:
+            metrics.observe(f"{self.name}.flush", (time.perf_counter() - t0) * 1000)
+            metrics.set_gauge(f"{self.name}.buffer_size", len(self._pending))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
@@ -12,7 +12,8 @@ from app.api.v1 import auth, users, projects, reminders, notifications, calendar
 from app.api.v1.ai import generate as ai_generate, keys as ai_keys
 from app.core.database import Database
 from app.models.db_models import Base
-from app.core.database import engine
+from app.core.database import engine, last_used_buffer
+from app.core.ai.http import upstream
 
 db = Database()
 
@@ -23,7 +24,10 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     await db.ensure_admin_user()
+    last_used_buffer.start()
     yield
+    await upstream.aclose()
+    await last_used_buffer.stop()
     print("👋 Завершение работы")
 
 app = FastAPI(
@@ -0,0 +1,58 @@
+"""usage hourly/daily rollups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _create_rollup(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('endpoint', sa.String(), server_default='', nullable=False),
+        sa.Column('requests', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('tokens', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+        sa.Column('cost', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.UniqueConstraint('bucket', 'user_id', 'provider', 'endpoint', name=f'uq_{name}_key'),
+    )
+    op.create_index(f'ix_{name}_bucket', name, ['bucket'])
+    op.create_index(f'ix_{name}_user_id', name, ['user_id'])
+
+
+def upgrade() -> None:
+    _create_rollup('usage_hourly')
+    _create_rollup('usage_daily')
+
+    # Backfill from the raw ledger; from here on the usage flush keeps them current
+    for name, unit in (('usage_hourly', 'hour'), ('usage_daily', 'day')):
+        op.execute(
+            f"""
+            INSERT INTO {name} (bucket, user_id, provider, endpoint, requests, tokens, cost)
+            SELECT date_trunc('{unit}', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+                   user_id, provider, coalesce(endpoint, ''),
+                   count(*), sum(tokens_used), sum(cost_estimate)
+            FROM usage
+            GROUP BY 1, 2, 3, 4
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_usage_daily_user_id', table_name='usage_daily')
+    op.drop_index('ix_usage_daily_bucket', table_name='usage_daily')
+    op.drop_table('usage_daily')
+    op.drop_index('ix_usage_hourly_user_id', table_name='usage_hourly')
+    op.drop_index('ix_usage_hourly_bucket', table_name='usage_hourly')
+    op.drop_table('usage_hourly')
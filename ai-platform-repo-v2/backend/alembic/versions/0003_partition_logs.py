@@ -0,0 +1,103 @@
+"""monthly range partitions for usage and project_logs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Rebuilds both append-only tables as ``PARTITION BY RANGE (created_at)``
+with one partition per UTC month (``<table>_pYYYYMM``), from the oldest
+row's month up to a few months ahead. app/core/partitions.py keeps
+creating future partitions and drops/detaches expired ones afterwards.
+Existing ids and their sequence are kept. Postgres 12+.
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+TABLES = {
+    'usage': (
+        "id integer NOT NULL DEFAULT nextval('usage_id_seq'), "
+        "user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE, "
+        "provider varchar NOT NULL, "
+        "tokens_used integer NOT NULL, "
+        "cost_estimate double precision NOT NULL, "
+        "endpoint varchar, "
+        "created_at timestamptz NOT NULL DEFAULT now()",
+        "id, user_id, provider, tokens_used, cost_estimate, endpoint, coalesce(created_at, now())",
+    ),
+    'project_logs': (
+        "id integer NOT NULL DEFAULT nextval('project_logs_id_seq'), "
+        "project_id integer NOT NULL REFERENCES projects(id) ON DELETE CASCADE, "
+        "log_type varchar NOT NULL, "
+        "message text NOT NULL, "
+        "created_at timestamptz NOT NULL DEFAULT now()",
+        "id, project_id, log_type, message, coalesce(created_at, now())",
+    ),
+}
+
+
+def _month(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(ts: datetime) -> datetime:
+    return datetime(ts.year + ts.month // 12, ts.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _create_partitions(table: str, first: datetime, last: datetime) -> None:
+    month = first
+    while month <= last:
+        nxt = _next_month(month)
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{nxt:%Y-%m-%d} 00:00:00+00')"
+        )
+        month = nxt
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    now = _month(datetime.now(timezone.utc))
+    last = now
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+
+    for table, (columns, select_list) in TABLES.items():
+        oldest = bind.execute(sa.text(f"SELECT min(created_at) FROM {table}")).scalar()
+        first = min(_month(oldest.astimezone(timezone.utc)), now) if oldest else now
+
+        # Keep the id sequence: detach it from the old table before that is dropped
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        op.execute(f"ALTER TABLE {table}_old RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey")
+        op.execute(f"ALTER INDEX IF EXISTS ix_{table}_id RENAME TO ix_{table}_old_id")
+
+        # The partition key has to be part of the primary key
+        op.execute(f"CREATE TABLE {table} ({columns}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)")
+        _create_partitions(table, first, last)
+        op.execute(f"INSERT INTO {table} SELECT {select_list} FROM {table}_old")
+        op.execute(f"DROP TABLE {table}_old")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    op.create_index('ix_usage_created_at', 'usage', ['created_at'])
+    op.create_index('ix_usage_user_id_created_at', 'usage', ['user_id', 'created_at'])
+    op.create_index('ix_project_logs_project_id_created_at', 'project_logs', ['project_id', 'created_at'])
+
+
+def downgrade() -> None:
+    for table, (columns, _) in TABLES.items():
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+        op.execute(f"CREATE TABLE {table} ({columns}, PRIMARY KEY (id))")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+        op.execute(f"DROP TABLE {table}_partitioned")  # drops its partitions and indexes too
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
@@ -0,0 +1,73 @@
+"""composite and partial indexes for the per-user list queries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+One index per ``Database`` read path: equality columns first, then the
+ORDER BY / range column. Partial indexes cover the default filters
+(unread notifications, active reminders). chat_threads / chat_messages
+were so far only created by ``create_all``, so they are created here when
+missing. ``benchmarks/explain_plans.py`` checks that every query uses them.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # (name, table, columns, partial WHERE)
+    ('ix_users_created_at', 'users', ['created_at'], None),
+    ('ix_api_keys_created_at', 'api_keys', ['created_at'], None),
+    ('ix_projects_user_id_created_at', 'projects', ['user_id', 'created_at'], None),
+    ('ix_reminders_user_id_remind_at', 'reminders', ['user_id', 'remind_at'], None),
+    ('ix_reminders_active_user_id_remind_at', 'reminders', ['user_id', 'remind_at'], 'is_active'),
+    ('ix_notifications_user_id_created_at', 'notifications', ['user_id', 'created_at'], None),
+    ('ix_notifications_unread_user_id_created_at', 'notifications', ['user_id', 'created_at'], 'NOT is_read'),
+    ('ix_calendar_events_user_id_start_time', 'calendar_events', ['user_id', 'start_time'], None),
+    ('ix_chat_threads_user_id_created_at', 'chat_threads', ['user_id', 'created_at'], None),
+    ('ix_chat_threads_user_id_project_id_created_at', 'chat_threads', ['user_id', 'project_id', 'created_at'], None),
+    ('ix_chat_messages_thread_id_created_at', 'chat_messages', ['thread_id', 'created_at'], None),
+]
+
+
+def upgrade() -> None:
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'chat_threads' not in tables:
+        op.create_table(
+            'chat_threads',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('project_id', sa.Integer(), sa.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('title', sa.String(), server_default='Новый чат', nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index('ix_chat_threads_user_id', 'chat_threads', ['user_id'])
+        op.create_index('ix_chat_threads_project_id', 'chat_threads', ['project_id'])
+    if 'chat_messages' not in tables:
+        op.create_table(
+            'chat_messages',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('thread_id', sa.Integer(), sa.ForeignKey('chat_threads.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('role', sa.String(), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        )
+        op.create_index('ix_chat_messages_thread_id', 'chat_messages', ['thread_id'])
+
+    for name, table, columns, where in INDEXES:
+        op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+
+    # Leading column of ix_projects_user_id_created_at
+    op.drop_index('ix_projects_user_id', table_name='projects')
+
+
+def downgrade() -> None:
+    op.create_index('ix_projects_user_id', 'projects', ['user_id'])
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
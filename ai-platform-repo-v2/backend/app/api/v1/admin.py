@@ -1,8 +1,13 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional, Tuple
+
 from fastapi import APIRouter, Depends, HTTPException
-from typing import Optional
 
 from app.api.v1.deps import get_current_admin
 from app.core.database import Database
+from app.core.metrics import metrics
+from app.core.ai.router import router as provider_router
+from app.core.ai.limits import limits
 
 router = APIRouter()
 db = Database()
@@ -20,12 +25,78 @@ async def set_user_flags(user_id: int, is_admin: Optional[bool] = None, is_activ
     return {"ok": True}
 
 @router.get("/requests")
-async def last_requests(limit: int = 200, admin: dict = Depends(get_current_admin)):
-    # We expose latest usage rows as "requests log"
-    items = await db.get_usage(limit=limit)
+async def last_requests(limit: int = 200, days: Optional[int] = None, admin: dict = Depends(get_current_admin)):
+    # We expose latest usage rows as "requests log"; pass `days` to read only recent partitions
+    items = await db.get_usage(limit=limit, days=days)
     return {"requests": items}
 
+# ---------- Usage analytics (served from usage_hourly / usage_daily rollups) ----------
+MAX_SERIES_POINTS = 2000
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+
+def _range(start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Default to the last 30 days; naive datetimes are taken as UTC."""
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    start = _utc(start) if start else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(400, "start must be before end")
+    return start, end
+
+
+@router.get("/analytics/users")
+async def usage_by_user(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    order_by: Literal["cost", "tokens", "requests"] = "cost",
+    limit: int = 100,
+    admin: dict = Depends(get_current_admin),
+):
+    # Per-user spend; with a small limit this is the "top consumers" list
+    start, end = _range(start, end)
+    items = await db.usage_totals(start, end, "user_id", order_by=order_by, limit=min(limit, 1000))
+    return {"start": start.isoformat(), "end": end.isoformat(), "users": items}
+
+@router.get("/analytics/providers")
+async def usage_by_provider(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    order_by: Literal["cost", "tokens", "requests"] = "cost",
+    admin: dict = Depends(get_current_admin),
+):
+    start, end = _range(start, end)
+    items = await db.usage_totals(start, end, "provider", order_by=order_by)
+    return {"start": start.isoformat(), "end": end.isoformat(), "providers": items}
+
+@router.get("/analytics/throughput")
+async def usage_throughput(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Literal["hour", "day"] = "hour",
+    user_id: Optional[int] = None,
+    provider: Optional[str] = None,
+    admin: dict = Depends(get_current_admin),
+):
+    # Requests/tokens/cost per bucket; buckets without usage are omitted
+    start, end = _range(start, end)
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    if (end - start) / step > MAX_SERIES_POINTS:
+        raise HTTPException(400, f"Range too large for granularity={granularity}")
+    series = await db.usage_series(start, end, granularity, user_id=user_id, provider=provider)
+    return {"start": start.isoformat(), "end": end.isoformat(), "granularity": granularity, "series": series}
+
 @router.get("/keys")
 async def list_keys(user_id: Optional[int] = None, admin: dict = Depends(get_current_admin)):
     keys = await db.admin_list_api_keys(user_id=user_id)
     return {"keys": keys}
+
+@router.get("/metrics")
+async def get_metrics(admin: dict = Depends(get_current_admin)):
+    return metrics.snapshot()
+
+@router.get("/ai/providers")
+async def provider_health(admin: dict = Depends(get_current_admin)):
+    return {"providers": provider_router.snapshot(), "limits": limits.snapshot()}
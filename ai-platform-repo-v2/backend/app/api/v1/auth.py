@@ -36,7 +36,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_jwt(user["id"], user["is_admin"])
+    access_token = create_jwt(user["id"], user["is_admin"], user["is_active"])
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login_json", response_model=Token)
@@ -44,7 +44,7 @@ async def login_json(payload: LoginJSON):
     user = await db.authenticate_user(payload.email, payload.password)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
-    access_token = create_jwt(user["id"], user["is_admin"])
+    access_token = create_jwt(user["id"], user["is_admin"], user["is_active"])
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/telegram", response_model=Token)
@@ -68,5 +68,5 @@ async def telegram(payload: TelegramLogin):
         access_token = create_jwt(user_id, False)
         return {"access_token": access_token, "token_type": "bearer"}
 
-    access_token = create_jwt(user["id"], user["is_admin"])
+    access_token = create_jwt(user["id"], user["is_admin"], user["is_active"])
     return {"access_token": access_token, "token_type": "bearer"}
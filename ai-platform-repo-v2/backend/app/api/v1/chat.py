@@ -1,23 +1,27 @@
+import time
+
 from fastapi import APIRouter, Depends, HTTPException
 
-from app.api.v1.deps import get_current_user
-from app.core.database import Database
+from app.api.v1.deps import get_token_user, get_unit_of_work
+from app.core.config import settings
+from app.core.database import Database, UnitOfWork, outside_unit_of_work
 from app.core.ai.manager import AIManager
 from app.models.schemas import ChatThreadCreate, ChatMessageCreate
 
 
-router = APIRouter()
+# Ownership checks and writes of a request share one session/transaction
+router = APIRouter(dependencies=[Depends(get_unit_of_work)])
 db = Database()
 ai = AIManager()
 
 
 @router.get("/chat/threads")
-async def list_threads(project_id: int | None = None, limit: int = 100, user: dict = Depends(get_current_user)):
+async def list_threads(project_id: int | None = None, limit: int = 100, user: dict = Depends(get_token_user)):
     return {"threads": await db.list_threads(user["id"], project_id=project_id, limit=limit)}
 
 
 @router.post("/chat/threads")
-async def create_thread(payload: ChatThreadCreate, user: dict = Depends(get_current_user)):
+async def create_thread(payload: ChatThreadCreate, user: dict = Depends(get_token_user)):
     try:
         tid = await db.create_thread(user["id"], payload.project_id, payload.title)
     except ValueError:
@@ -26,7 +30,7 @@ async def create_thread(payload: ChatThreadCreate, user: dict = Depends(get_curr
 
 
 @router.get("/chat/threads/{thread_id}")
-async def get_thread(thread_id: int, user: dict = Depends(get_current_user)):
+async def get_thread(thread_id: int, user: dict = Depends(get_token_user)):
     th = await db.get_thread(user["id"], thread_id)
     if not th:
         raise HTTPException(404, "Thread not found")
@@ -34,7 +38,7 @@ async def get_thread(thread_id: int, user: dict = Depends(get_current_user)):
 
 
 @router.get("/chat/threads/{thread_id}/messages")
-async def list_messages(thread_id: int, limit: int = 200, user: dict = Depends(get_current_user)):
+async def list_messages(thread_id: int, limit: int = 200, user: dict = Depends(get_token_user)):
     try:
         msgs = await db.list_messages(user["id"], thread_id, limit=limit)
     except ValueError:
@@ -43,7 +47,12 @@ async def list_messages(thread_id: int, limit: int = 200, user: dict = Depends(g
 
 
 @router.post("/chat/threads/{thread_id}/messages")
-async def post_message(thread_id: int, payload: ChatMessageCreate, user: dict = Depends(get_current_user)):
+async def post_message(
+    thread_id: int,
+    payload: ChatMessageCreate,
+    user: dict = Depends(get_token_user),
+    uow: UnitOfWork = Depends(get_unit_of_work),
+):
     """Append a message. If role=user, we will also generate assistant reply and save it."""
     if not payload.content.strip():
         raise HTTPException(400, "content required")
@@ -56,15 +65,28 @@ async def post_message(thread_id: int, payload: ChatMessageCreate, user: dict =
     if payload.role != "user":
         return {"ok": True}
 
+    # Keep the user's message even if generation fails, and hold no connection during it
+    await uow.commit()
+
     # Generate assistant response
-    resp = await ai.generate(
-        prompt=payload.content,
-        provider=payload.provider,
-        model=payload.model,
-        temperature=payload.temperature,
-        max_tokens=payload.max_tokens,
-        json_mode=False,
+    async with outside_unit_of_work():
+        result = await ai.generate(
+            prompt=payload.content,
+            provider=payload.provider,
+            model=payload.model,
+            temperature=payload.temperature,
+            max_tokens=payload.max_tokens,
+            json_mode=False,
+            user_id=user["id"],
+            deadline=time.monotonic() + settings.AI_REQUEST_TIMEOUT,
+        )
+    # The thread is still in the session's identity map: no second ownership SELECT
+    await db.add_message(user["id"], thread_id, "assistant", result.text)
+    await db.add_usage(
         user_id=user["id"],
+        provider=result.provider,
+        tokens=result.total_tokens,
+        cost=result.cost,
+        endpoint="/chat/messages",
     )
-    await db.add_message(user["id"], thread_id, "assistant", resp)
-    return {"response": resp}
+    return {"response": result.text}
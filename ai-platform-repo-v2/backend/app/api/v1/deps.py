@@ -1,33 +1,74 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional
+from typing import Dict, Optional
 
+from app.core.cache import MISSING
+from app.core.config import settings
 from app.core.security.auth import decode_jwt
-from app.core.database import Database
+from app.core.security.user_cache import user_cache
+from app.core.database import Database, unit_of_work
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 db = Database()
 
-async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+async def get_unit_of_work():
+    """Request-scoped ``UnitOfWork``: ``Database`` calls of the request share one
+    session and transaction, committed after the endpoint (rolled back on error)."""
+    async with unit_of_work() as uow:
+        yield uow
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+def _inactive_exception() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+
+async def load_user(user_id: int) -> Optional[Dict]:
+    """``Database.get_user`` through ``user_cache`` (in-process, then Redis)."""
+    user = await user_cache.get_shared(user_id)
+    if user is MISSING:
+        user = await db.get_user(user_id)
+        if user is not None:
+            await user_cache.set_shared(user_id, user)
+    return user
+
+async def get_current_user(token: Optional[str] = Depends(oauth2_scheme)):
     if not token:
-        raise credentials_exception
+        raise _credentials_exception()
 
     payload = decode_jwt(token)
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
-    user = await db.get_user(payload["user_id"])
+    user = await load_user(payload["user_id"])
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    if not user.get("is_active", True):
+        raise _inactive_exception()
 
     return user
 
+async def get_token_user(token: Optional[str] = Depends(oauth2_scheme)):
+    """Identity only: ``{"id", "is_admin"}`` straight from the JWT claims.
+
+    Needs no lookup at all when JWT_EMBED_FLAGS is on and the token carries
+    ``is_active``; otherwise behaves exactly like ``get_current_user``.
+    """
+    if not settings.JWT_EMBED_FLAGS:
+        return await get_current_user(token)
+    payload = decode_jwt(token) if token else None
+    if payload is None:
+        raise _credentials_exception()
+    if "is_active" not in payload:  # issued before flags were embedded
+        return await get_current_user(token)
+    if not payload["is_active"]:
+        raise _inactive_exception()
+    return {"id": payload["user_id"], "is_admin": bool(payload.get("is_admin"))}
+
 async def get_current_admin(user: dict = Depends(get_current_user)):
     if not user.get("is_admin"):
         raise HTTPException(
@@ -43,4 +84,4 @@ async def get_optional_user(token: Optional[str] = Depends(oauth2_scheme)):
     payload = decode_jwt(token)
     if not payload:
         return None
-    return await db.get_user(payload["user_id"])
+    return await load_user(payload["user_id"])
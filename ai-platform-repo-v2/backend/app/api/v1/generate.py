@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+import logging
+import time
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from starlette.websockets import WebSocketState
 from typing import List
 
-from app.api.v1.deps import get_current_user, get_optional_user
+from app.api.v1.deps import get_token_user, get_optional_user
 from app.core.ai.manager import AIManager
+from app.core.config import settings
 from app.core.database import Database
 from app.models.schemas import GenerateRequest
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 ai_manager = AIManager()
 db = Database()
@@ -13,51 +19,90 @@ db = Database()
 @router.post("/generate")
 async def generate_text(
     request: GenerateRequest,
-    user: dict = Depends(get_current_user)
+    user: dict = Depends(get_token_user)
 ):
     """Generate text using AI."""
-    response = await ai_manager.generate(
+    result = await ai_manager.generate(
         prompt=request.prompt,
         provider=request.provider,
         model=request.model,
         temperature=request.temperature,
         max_tokens=request.max_tokens,
         json_mode=request.json_mode,
-        user_id=user["id"]
+        user_id=user["id"],
+        cache=request.cache,
+        hedge=request.hedge,
+        deadline=time.monotonic() + settings.AI_REQUEST_TIMEOUT
     )
 
-    # Track usage (simplified)
     await db.add_usage(
         user_id=user["id"],
-        provider=request.provider or "auto",
-        tokens=len(request.prompt.split()) + len(response.split()),
-        cost=0.001,
+        provider=result.provider,
+        tokens=result.total_tokens,
+        cost=result.cost,
         endpoint="/ai/generate"
     )
 
-    return {"response": response}
+    return {
+        "response": result.text,
+        "provider": result.provider,
+        "model": result.model,
+        "usage": {
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.completion_tokens,
+            "total_tokens": result.total_tokens,
+            "cost": result.cost,
+        },
+    }
 
 @router.websocket("/stream")
 async def stream_generate(websocket: WebSocket):
+    """Authenticated by a JWT in the query string (``?token=``) or in the first
+    message (``{"token": ...}``): browsers cannot set headers on a websocket."""
     await websocket.accept()
+    token = websocket.query_params.get("token")
+    user = None
     try:
         while True:
             data = await websocket.receive_json()
+            if user is None:
+                try:
+                    user = await get_token_user(token or data.get("token"))
+                except HTTPException:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
             prompt = data.get("prompt")
             provider = data.get("provider")
-            user_id = data.get("user_id")  # In production, get from token
+            user_id = user["id"]
 
-            async for chunk in ai_manager.stream_generate(prompt, provider, user_id=user_id):
-                await websocket.send_text(chunk)
-            await websocket.send_text("[DONE]")
+            parts = []
+            deadline = time.monotonic() + settings.AI_REQUEST_TIMEOUT
+            try:
+                async for chunk in ai_manager.stream_generate(prompt, provider, user_id=user_id, deadline=deadline):
+                    parts.append(chunk)
+                    await websocket.send_text(chunk)
+                await websocket.send_text("[DONE]")
+            finally:
+                # Streams carry no usage block: count tokens locally, including
+                # what was produced before the provider or the client broke off.
+                if parts and not parts[0].startswith("[ERROR]"):
+                    result = ai_manager.stream_usage(prompt, "".join(parts), provider)
+                    await db.add_usage(
+                        user_id=user_id,
+                        provider=result.provider,
+                        tokens=result.total_tokens,
+                        cost=result.cost,
+                        endpoint="/ai/stream"
+                    )
     except WebSocketDisconnect:
-        print("Client disconnected")
+        logger.info("/ai/stream client disconnected")
     except Exception as e:
         await websocket.send_text(f"[ERROR] {str(e)}")
     finally:
-        await websocket.close()
+        if websocket.client_state == WebSocketState.CONNECTED and websocket.application_state == WebSocketState.CONNECTED:
+            await websocket.close()
 
 @router.get("/models")
-async def list_models(user: dict = Depends(get_current_user)):
+async def list_models(user: dict = Depends(get_token_user)):
     return await ai_manager.list_models(user_id=user["id"])
 
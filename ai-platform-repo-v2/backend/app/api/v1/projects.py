@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from typing import List
 
-from app.api.v1.deps import get_current_user
+from app.api.v1.deps import get_token_user
 from app.core.database import Database
 from app.models.schemas import ProjectConfig, ProjectCreate
 
@@ -12,7 +12,7 @@ db = Database()
 async def create_project_from_idea(
     idea: str,
     background_tasks: BackgroundTasks,
-    user: dict = Depends(get_current_user)
+    user: dict = Depends(get_token_user)
 ):
     """Create a new project from a text idea."""
     # Simplified: In a real app, you'd analyze the idea with AI
@@ -34,13 +34,13 @@ async def create_project_from_idea(
     }
 
 @router.get("/projects")
-async def list_projects(user: dict = Depends(get_current_user)):
+async def list_projects(user: dict = Depends(get_token_user)):
     projects = await db.list_projects(user["id"])
     return {"projects": projects}
 
 
 @router.post("/projects")
-async def create_project(payload: ProjectCreate, user: dict = Depends(get_current_user)):
+async def create_project(payload: ProjectCreate, user: dict = Depends(get_token_user)):
     cfg = payload.config or {
         "name": payload.name,
         "description": payload.description,
@@ -54,7 +54,7 @@ async def create_project(payload: ProjectCreate, user: dict = Depends(get_curren
     return {"id": pid}
 
 @router.get("/projects/{project_id}")
-async def get_project(project_id: int, user: dict = Depends(get_current_user)):
+async def get_project(project_id: int, user: dict = Depends(get_token_user)):
     project = await db.get_project(project_id, user["id"])
     if not project:
         raise HTTPException(404, "Project not found")
@@ -2,14 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from pathlib import Path
 import shutil
 
-from app.api.v1.deps import get_current_user
+from app.api.v1.deps import get_current_user, get_unit_of_work
 from app.core.database import Database
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(get_unit_of_work)])
 db = Database()
 
 @router.get("/me")
 async def get_me(user: dict = Depends(get_current_user)):
+    # Straight from user_cache: profile updates, new projects, logins and usage flushes invalidate it
     return user
 
 @router.put("/me/settings")
@@ -0,0 +1,40 @@
+from typing import Optional
+
+
+class UpstreamError(RuntimeError):
+    """A provider call failed. ``status`` is None for timeouts/transport errors."""
+
+    def __init__(self, provider: str, status: Optional[int], message: str):
+        super().__init__(f"{provider} error {status if status is not None else 'network'}: {message}")
+        self.provider = provider
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        """Worth trying elsewhere: 5xx or no response at all."""
+        return self.status is None or self.status >= 500
+
+
+class RateLimited(UpstreamError):
+    """The provider answered 429, or our own admission queue timed out for it."""
+
+    def __init__(self, provider: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(provider, 429, message)
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        """Another provider may well have capacity."""
+        return True
+
+
+class DeadlineExceeded(UpstreamError):
+    """The request's overall deadline ran out before a provider answered."""
+
+    def __init__(self, provider: str, message: str = "deadline exceeded"):
+        super().__init__(provider, 504, message)
+
+    @property
+    def retryable(self) -> bool:
+        """No budget left for anyone else either."""
+        return False
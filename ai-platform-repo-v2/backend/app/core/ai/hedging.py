@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from app.core.ai.errors import UpstreamError
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class HedgeBudget:
+    """At most ``limit`` hedges per user per fixed ``window`` seconds."""
+
+    def __init__(self, limit: int, window: float, maxsize: int = 10000):
+        self.limit = limit
+        self._spent = TTLCache(maxsize=maxsize, ttl=window)
+
+    def acquire(self, user_id: Optional[int]) -> bool:
+        spent = self._spent.get(user_id)
+        if spent is None:
+            spent = [0]
+            self._spent.set(user_id, spent)
+        if spent[0] >= self.limit:
+            return False
+        spent[0] += 1
+        return True
+
+
+hedge_budget = HedgeBudget(settings.AI_HEDGE_BUDGET, settings.AI_HEDGE_BUDGET_WINDOW)
+
+
+def hedge_delay(p95_ms: Optional[float]) -> float:
+    """Seconds to wait for the primary: its observed p95, or a default until measured."""
+    delay_ms = settings.AI_HEDGE_DELAY_MS if p95_ms is None else p95_ms
+    return max(delay_ms, settings.AI_HEDGE_MIN_DELAY_MS) / 1000
+
+
+async def hedged(
+    call: Callable[[str], Awaitable[Any]],
+    primary: str,
+    secondary: str,
+    delay: float,
+    user_id: Optional[int],
+) -> Tuple[str, Any]:
+    """Run ``call(primary)``; if it is still pending after ``delay``, race ``call(secondary)``.
+
+    Returns ``(provider, result)`` from whichever succeeds first and cancels the
+    other. Without a hedge (fast primary or exhausted budget) a retryable
+    primary failure falls over to ``secondary``.
+    """
+    first = asyncio.ensure_future(call(primary))
+    tasks = {first: primary}
+    try:
+        await asyncio.wait({first}, timeout=delay)
+        if first.done() or not hedge_budget.acquire(user_id):
+            if not first.done():
+                metrics.inc("ai.hedge.budget_exhausted")
+            try:
+                return primary, await first
+            except UpstreamError as e:
+                if not e.retryable:
+                    raise
+                metrics.inc("ai.router.failovers")
+                return secondary, await call(secondary)
+
+        metrics.inc("ai.hedge.fired")
+        second = asyncio.ensure_future(call(secondary))
+        tasks[second] = secondary
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    metrics.inc("ai.hedge.wins" if task is second else "ai.hedge.primary_wins")
+                    return tasks[task], task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
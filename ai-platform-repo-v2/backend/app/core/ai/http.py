@@ -0,0 +1,50 @@
+import asyncio
+import ssl
+from typing import Dict, Union
+
+import httpx
+
+from app.core.config import settings
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class UpstreamClients:
+    """App-lifetime httpx clients, one per provider base URL.
+
+    Clients are keyed by base URL (never by API key): auth travels in
+    per-request headers, so all users of a provider share keep-alive
+    connections instead of paying TCP+TLS handshakes on every call.
+    """
+
+    def __init__(self, verify: Union[bool, ssl.SSLContext] = True):
+        self._verify = verify
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, base_url: str) -> httpx.AsyncClient:
+        base = base_url.rstrip("/")
+        client = self._clients.get(base)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=settings.AI_HTTP2 and HTTP2_AVAILABLE,
+                verify=self._verify,
+                limits=httpx.Limits(
+                    max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(settings.AI_HTTP_TIMEOUT, connect=settings.AI_HTTP_CONNECT_TIMEOUT),
+            )
+            self._clients[base] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+
+
+upstream = UpstreamClients()
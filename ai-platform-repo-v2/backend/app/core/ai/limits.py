@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Mapping, Optional
+
+from app.core.ai.errors import RateLimited
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Atomically: honour a Retry-After block, then take 1 request and N tokens from
+# the RPM/TPM buckets (all or nothing). Returns the seconds to wait, 0 if admitted.
+_ADMIT_LUA = """
+local block = redis.call('PTTL', KEYS[3])
+if block > 0 then return tostring(block / 1000) end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local wait, state = 0, {}
+for i = 1, 2 do
+  local cap, need = tonumber(ARGV[i]), tonumber(ARGV[i + 2])
+  if cap > 0 then
+    local b = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(b[1]) or cap
+    tokens = math.min(cap, tokens + (now - (tonumber(b[2]) or now)) * cap / 60)
+    need = math.min(need, cap)
+    if tokens < need then wait = math.max(wait, (need - tokens) * 60 / cap) end
+    state[i] = {tokens, need}
+  end
+end
+for i = 1, 2 do
+  if state[i] then
+    local tokens = state[i][1]
+    if wait == 0 then tokens = tokens - state[i][2] end
+    redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[i], 120)
+  end
+end
+return tostring(wait)
+"""
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds from ``retry-after-ms`` / ``Retry-After`` (delta-seconds or HTTP date)."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """Per-minute token bucket; capacity is the full minute's allowance."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.ts = time.monotonic()
+
+    def wait(self, need: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.capacity / 60)
+        self.ts = now
+        need = min(need, self.capacity)
+        return 0.0 if self.tokens >= need else (need - self.tokens) * 60 / self.capacity
+
+
+class ProviderLimiter:
+    """Concurrency slots plus RPM/TPM buckets for one (provider, API key)."""
+
+    def __init__(self, ident: str, concurrency: int, rpm: float, tpm: float):
+        self.ident = ident
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._rpm = _Bucket(rpm) if rpm > 0 else None
+        self._tpm = _Bucket(tpm) if tpm > 0 else None
+
+    def local_wait(self, tokens: int) -> float:
+        blocked = self.blocked_until - time.monotonic()
+        if blocked > 0:
+            return blocked
+        buckets = [(b, n) for b, n in ((self._rpm, 1), (self._tpm, tokens)) if b is not None]
+        wait = max((b.wait(n) for b, n in buckets), default=0.0)
+        if wait == 0:
+            for b, n in buckets:
+                b.tokens -= min(n, b.capacity)
+        return wait
+
+
+class AdmissionControl:
+    """Admission layer in front of every provider call.
+
+    Each (provider, key) gets a concurrency semaphore and RPM/TPM token
+    buckets (``AI_LIMIT_*`` defaults, overridden per provider by
+    ``AI_PROVIDER_LIMITS``). Callers queue until admitted or until the queue
+    timeout, then get ``RateLimited``. A provider's ``Retry-After`` blocks the
+    key for that long. With Redis enabled the buckets and blocks are shared
+    by all workers; concurrency slots stay per process.
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, ProviderLimiter] = {}
+
+    def _limiter(self, provider: str, api_key: str) -> ProviderLimiter:
+        ident = f"{provider}:{hashlib.sha256(api_key.encode()).hexdigest()[:12]}"
+        limiter = self._limiters.get(ident)
+        if limiter is None:
+            conf = settings.AI_PROVIDER_LIMITS.get(provider, {})
+            limiter = self._limiters[ident] = ProviderLimiter(
+                ident,
+                concurrency=int(conf.get("concurrency", settings.AI_LIMIT_CONCURRENCY)),
+                rpm=float(conf.get("rpm", settings.AI_LIMIT_RPM)),
+                tpm=float(conf.get("tpm", settings.AI_LIMIT_TPM)),
+            )
+        return limiter
+
+    async def _wait(self, limiter: ProviderLimiter, tokens: int) -> float:
+        redis = get_redis()
+        if redis is not None:
+            prefix = settings.AI_LIMIT_REDIS_PREFIX + limiter.ident
+            try:
+                wait = await redis.eval(
+                    _ADMIT_LUA, 3, prefix + ":rpm", prefix + ":tpm", prefix + ":block",
+                    limiter.rpm, limiter.tpm, 1, tokens,
+                )
+                return float(wait)
+            except Exception as e:
+                logger.warning("shared rate limit check failed, using local buckets: %s", e)
+        return limiter.local_wait(tokens)
+
+    @asynccontextmanager
+    async def acquire(
+        self, provider: str, api_key: str, tokens: int = 0, timeout: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """Hold a slot for one call estimated at ``tokens`` (prompt + max output)."""
+        limiter = self._limiter(provider, api_key)
+        started = time.monotonic()
+        deadline = started + (settings.AI_LIMIT_QUEUE_TIMEOUT if timeout is None else timeout)
+
+        if limiter.semaphore is not None:
+            try:
+                await asyncio.wait_for(limiter.semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                metrics.inc("ai.limits.rejected")
+                raise RateLimited(provider, "очередь к провайдеру переполнена")
+        try:
+            while True:
+                wait = await self._wait(limiter, tokens)
+                if wait <= 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    metrics.inc("ai.limits.rejected")
+                    raise RateLimited(provider, "превышен лимит запросов к провайдеру", retry_after=wait)
+                metrics.inc("ai.limits.queued")
+                await asyncio.sleep(wait)
+            metrics.observe("ai.limits.wait", (time.monotonic() - started) * 1000)
+
+            limiter.in_flight += 1
+            try:
+                yield
+            finally:
+                limiter.in_flight -= 1
+        finally:
+            if limiter.semaphore is not None:
+                limiter.semaphore.release()
+
+    async def block(self, provider: str, api_key: str, seconds: Optional[float]) -> None:
+        """Stop admitting calls for this key for ``seconds`` (a provider's Retry-After)."""
+        if not seconds:
+            return
+        limiter = self._limiter(provider, api_key)
+        limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + seconds)
+        metrics.inc("ai.limits.retry_after")
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.set(settings.AI_LIMIT_REDIS_PREFIX + limiter.ident + ":block", 1, px=int(seconds * 1000))
+            except Exception as e:
+                logger.warning("shared Retry-After block failed: %s", e)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        return {
+            ident: {
+                "in_flight": limiter.in_flight,
+                "concurrency": limiter.concurrency,
+                "rpm": limiter.rpm,
+                "tpm": limiter.tpm,
+                "blocked_for": max(0.0, limiter.blocked_until - now),
+            }
+            for ident, limiter in self._limiters.items()
+        }
+
+
+limits = AdmissionControl()
@@ -1,12 +1,68 @@
 import os
 import json
 import asyncio
-import aiohttp
+import functools
+import hashlib
+import time
+from dataclasses import dataclass, field
 from typing import Optional, List, Dict, Any, AsyncGenerator
+import httpx
 from app.core.database import Database
+from app.core.ai.http import upstream
+from app.core.ai.sse import iter_chat_deltas
+from app.core.ai.response_cache import response_cache, request_key, is_cacheable
+from app.core.ai.semantic_cache import semantic_cache
+from app.core.ai.singleflight import singleflight
+from app.core.ai.errors import RateLimited, UpstreamError
+from app.core.ai.limits import limits, parse_retry_after
+from app.core.ai.retry import call_with_retries, stream_with_retries
+from app.core.ai.router import router
+from app.core.ai.hedging import hedged, hedge_delay
+from app.core.ai.usage import Generation, count_tokens
+from app.core.ai.mock import mock_llm
+from app.core.config import settings
+from app.core.cache import MISSING
+from app.core.security.key_cache import key_cache
+from app.core.metrics import metrics
 
 db = Database()
 
+OPENAI_BASE = "https://api.openai.com/v1"
+GROQ_BASE = "https://api.groq.com/openai/v1"
+
+# Providers reachable through the OpenAI-compatible chat/completions API.
+OPENAI_COMPAT = {"openai": OPENAI_BASE, "groq": GROQ_BASE}
+if settings.AI_MOCK_BASE_URL:
+    OPENAI_COMPAT["mock"] = settings.AI_MOCK_BASE_URL.rstrip("/")
+
+# What each provider can do through this manager; providers not listed here
+# may hold a key but cannot be called yet.
+PROVIDER_CAPABILITIES: Dict[str, Dict[str, bool]] = {
+    "openai": {"chat": True, "stream": True, "json_mode": True},
+    "groq": {"chat": True, "stream": True, "json_mode": True},
+    "mock": {"chat": True, "stream": True, "json_mode": True},
+}
+
+
+def is_supported(provider: str) -> bool:
+    """Callable through this manager: OpenAI-compatible, or the in-process mock."""
+    return provider in OPENAI_COMPAT or provider == "mock"
+
+
+def flight_key(api_key: Optional[str], *request: Any) -> str:
+    """Single-flight key: the request plus the key it is sent with, so callers only
+    share a result produced with their own credentials (and quota)."""
+    fingerprint = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+    return f"{request_key(*request)}:{fingerprint}"
+
+
+@dataclass(frozen=True)
+class ProviderInfo:
+    key: str
+    default_model: str
+    capabilities: Dict[str, bool] = field(default_factory=dict)
+
+
 class AIManager:
     def __init__(self):
         self.global_keys = {
@@ -20,6 +76,8 @@ class AIManager:
             "ai21": os.getenv("AI21_API_KEY"),
             "openrouter": os.getenv("OPENROUTER_API_KEY"),
             "hf": os.getenv("HF_API_KEY"),
+            # Local stand-in (see mock.py); needs no key, only AI_MOCK_ENABLED.
+            "mock": "mock" if settings.AI_MOCK_ENABLED else None,
         }
         self.default_models = {
             "openai": "gpt-4",
@@ -32,14 +90,39 @@ class AIManager:
             "ai21": "j2-ultra",
             "openrouter": "openai/gpt-3.5-turbo",
             "hf": "HuggingFaceH4/zephyr-7b-beta",
+            "mock": "mock",
         }
 
-    async def _get_key(self, provider: str, user_id: Optional[int] = None) -> Optional[str]:
+    async def resolve_providers(self, user_id: Optional[int] = None) -> Dict[str, ProviderInfo]:
+        """Map every usable provider to its key, default model and capabilities.
+
+        User keys are loaded in a single query and merged over the global env
+        keys; the merged map is cached per user (see ``key_cache``).
+        """
         if user_id:
-            user_key = await db.get_api_key(user_id, provider)
-            if user_key:
-                return user_key
-        return self.global_keys.get(provider)
+            cached = key_cache.get(user_id)
+            if cached is not MISSING:
+                return cached
+            user_keys = await db.get_api_keys(user_id)
+        else:
+            user_keys = {}
+
+        providers: Dict[str, ProviderInfo] = {}
+        for prov, global_key in self.global_keys.items():
+            api_key = user_keys.get(prov) or global_key
+            if api_key:
+                providers[prov] = ProviderInfo(
+                    key=api_key,
+                    default_model=self.default_models.get(prov, "gpt-3.5-turbo"),
+                    capabilities=PROVIDER_CAPABILITIES.get(prov, {}),
+                )
+        if user_id:
+            key_cache.set(user_id, providers)
+        return providers
+
+    async def _get_key(self, provider: str, user_id: Optional[int] = None) -> Optional[str]:
+        info = (await self.resolve_providers(user_id)).get(provider)
+        return info.key if info else None
 
     async def generate(
         self,
@@ -49,28 +132,90 @@ class AIManager:
         temperature: float = 0.7,
         max_tokens: int = 4000,
         json_mode: bool = False,
-        user_id: Optional[int] = None
-    ) -> str:
-        if not provider:
-            for prov in self.global_keys:
-                if await self._get_key(prov, user_id):
-                    provider = prov
-                    break
-            if not provider:
+        user_id: Optional[int] = None,
+        cache: Optional[str] = None,
+        hedge: bool = False,
+        deadline: Optional[float] = None
+    ) -> Generation:
+        """Complete ``prompt`` and return the text with its token usage.
+
+        ``deadline`` (``time.monotonic()``) bounds all retries and failovers.
+        """
+        providers = await self.resolve_providers(user_id)
+        if provider:
+            if provider not in providers:
+                raise ValueError(f"Нет API ключа для провайдера {provider}")
+            candidates = [provider]
+        else:
+            # Auto mode: every chat-capable provider, healthiest and fastest first.
+            chat = [p for p, info in providers.items() if info.capabilities.get("chat")]
+            if not chat:
                 raise ValueError("Нет доступных AI-провайдеров")
+            ranked = router.rank([(p, model or providers[p].default_model) for p in chat])
+            candidates = [p for p, _ in ranked]
 
-        api_key = await self._get_key(provider, user_id)
-        if not api_key:
-            raise ValueError(f"Нет API ключа для провайдера {provider}")
+        # Cache lookups use the preferred candidate; results are stored under
+        # whichever provider actually answered.
+        lookup_provider = candidates[0]
+        lookup_model = model or providers[lookup_provider].default_model
 
-        model = model or self.default_models.get(provider, "gpt-3.5-turbo")
+        cache_mode = cache or ("read" if settings.AI_CACHE_ENABLED else "bypass")
+        use_exact = cache_mode != "bypass" and is_cacheable(temperature, json_mode)
+        if use_exact and cache_mode == "read":
+            cached = await response_cache.get(
+                request_key(lookup_provider, lookup_model, prompt, temperature, max_tokens, json_mode)
+            )
+            if cached is not None:
+                return Generation.from_usage(cached, lookup_provider, lookup_model, prompt, cached=True)
 
-        if provider == "openai":
-            return await self._call_openai(prompt, model, temperature, max_tokens, api_key, json_mode)
-        elif provider == "groq":
-            return await self._call_groq(prompt, model, temperature, max_tokens, api_key, json_mode)
-        else:
-            raise ValueError(f"Провайдер {provider} не поддерживается")
+        semantic_mode = (cache or "read") if settings.AI_SEMANTIC_CACHE_ENABLED else "bypass"
+        if semantic_mode == "read":
+            cached = semantic_cache.lookup(
+                prompt, semantic_cache.scope(lookup_provider, lookup_model, json_mode, user_id)
+            )
+            if cached is not None:
+                return Generation.from_usage(cached, lookup_provider, lookup_model, prompt, cached=True)
+
+        async def call(provider: str) -> Generation:
+            if not is_supported(provider):
+                raise ValueError(f"Провайдер {provider} не поддерживается")
+            info = providers[provider]
+            prov_model = model or info.default_model
+            if user_id:
+                db.touch_api_key_last_used(user_id, provider)
+            return await singleflight.do(
+                flight_key(info.key, provider, prov_model, prompt, temperature, max_tokens, json_mode),
+                lambda: call_with_retries(
+                    provider,
+                    lambda: self._complete(provider, prompt, prov_model, temperature, max_tokens, info.key, json_mode),
+                    deadline,
+                ),
+            )
+
+        remaining = list(candidates)
+        while remaining:
+            provider = remaining.pop(0)
+            try:
+                if hedge and remaining:
+                    delay = hedge_delay(router.p95(provider, model or providers[provider].default_model))
+                    provider, result = await hedged(call, provider, remaining.pop(0), delay, user_id)
+                else:
+                    result = await call(provider)
+                break
+            except UpstreamError as e:
+                if not e.retryable or not remaining:
+                    raise
+                metrics.inc("ai.router.failovers")
+
+        prov_model = model or providers[provider].default_model
+        if result.text is not None:
+            if use_exact:
+                await response_cache.set(
+                    request_key(provider, prov_model, prompt, temperature, max_tokens, json_mode), result.text
+                )
+            if semantic_mode != "bypass":
+                semantic_cache.add(prompt, semantic_cache.scope(provider, prov_model, json_mode, user_id), result.text)
+        return result
 
     async def stream_generate(
         self,
@@ -79,25 +224,75 @@ class AIManager:
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 4000,
-        user_id: Optional[int] = None
+        user_id: Optional[int] = None,
+        deadline: Optional[float] = None
     ) -> AsyncGenerator[str, None]:
         provider = provider or "openai"
-        api_key = await self._get_key(provider, user_id)
-        if not api_key:
+        info = (await self.resolve_providers(user_id)).get(provider)
+        if not info:
             yield f"[ERROR] No API key for {provider}"
             return
+        api_key = info.key
 
-        model = model or self.default_models.get(provider, "gpt-3.5-turbo")
+        model = model or info.default_model
+        if user_id:
+            db.touch_api_key_last_used(user_id, provider)
 
-        if provider == "openai":
-            async for chunk in self._stream_openai(prompt, model, temperature, max_tokens, api_key):
+        if is_supported(provider):
+            chunks = singleflight.stream(
+                flight_key(api_key, provider, model, prompt, temperature, max_tokens, False),
+                lambda: stream_with_retries(
+                    provider,
+                    lambda: self._stream(provider, prompt, model, temperature, max_tokens, api_key),
+                    deadline,
+                ),
+            )
+            async for chunk in chunks:
                 yield chunk
         else:
             yield f"[ERROR] Streaming not supported for {provider}"
 
+    def stream_usage(self, prompt: str, text: str, provider: Optional[str] = None, model: Optional[str] = None) -> Generation:
+        """Usage of a finished stream, counted locally (streams report none)."""
+        provider = provider or "openai"
+        model = model or self.default_models.get(provider, "gpt-3.5-turbo")
+        return Generation.from_usage(text, provider, model, prompt)
+
+    async def _complete(self, provider, prompt, model, temperature, max_tokens, api_key, json_mode) -> Generation:
+        if provider == "openai":
+            call = self._call_openai
+        elif provider in OPENAI_COMPAT:
+            call = functools.partial(self._call_openai_compat, provider)
+        else:
+            call = self._call_mock
+        with router.dispatch(provider, model):
+            async with limits.acquire(provider, api_key, count_tokens(prompt, model) + max_tokens):
+                started = time.perf_counter()
+                try:
+                    result = await call(prompt, model, temperature, max_tokens, api_key, json_mode)
+                except RateLimited:
+                    raise  # throttling, not ill health: leave the circuit alone
+                except UpstreamError as e:
+                    if e.retryable:  # a 4xx is the caller's key or request, not the model's health
+                        router.record_failure(provider, model, (time.perf_counter() - started) * 1000)
+                    raise
+            router.record_success(provider, model, (time.perf_counter() - started) * 1000)
+        return result
+
+    async def _status_error(self, provider, api_key, status, headers, body) -> UpstreamError:
+        """Map a non-200 reply to an error, honouring Retry-After on 429/503."""
+        if status in (429, 503):
+            await limits.block(provider, api_key, parse_retry_after(headers))
+        if status == 429:
+            return RateLimited(provider, body, retry_after=parse_retry_after(headers))
+        return UpstreamError(provider, status, body)
+
     async def _call_openai(self, prompt, model, temperature, max_tokens, api_key, json_mode):
         import openai
-        client = openai.AsyncOpenAI(api_key=api_key)
+        # Retries are ours (see retry.py); SDK retries would multiply them.
+        client = openai.AsyncOpenAI(
+            api_key=api_key, base_url=OPENAI_BASE, http_client=upstream.get(OPENAI_BASE), max_retries=0
+        )
         try:
             response = await client.chat.completions.create(
                 model=model,
@@ -106,55 +301,93 @@ class AIManager:
                 max_tokens=max_tokens,
                 response_format={"type": "json_object"} if json_mode else None
             )
-            return response.choices[0].message.content
+            usage = response.usage.model_dump() if response.usage else None
+            return Generation.from_usage(response.choices[0].message.content, "openai", model, prompt, usage)
+        except openai.APIStatusError as e:
+            raise await self._status_error("openai", api_key, e.status_code, e.response.headers, str(e))
+        except (openai.APITimeoutError, openai.APIConnectionError) as e:
+            raise UpstreamError("openai", None, str(e))
         except Exception as e:
             raise RuntimeError(f"OpenAI error: {e}")
 
-    async def _call_groq(self, prompt, model, temperature, max_tokens, api_key, json_mode):
-        async with aiohttp.ClientSession() as session:
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-            payload = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "response_format": {"type": "json_object"} if json_mode else None
-            }
-            async with session.post("https://api.groq.com/openai/v1/chat/completions",
-                                    headers=headers, json=payload) as resp:
-                if resp.status != 200:
-                    text = await resp.text()
-                    raise RuntimeError(f"Groq error {resp.status}: {text}")
-                data = await resp.json()
-                return data["choices"][0]["message"]["content"]
-
-    async def _stream_openai(self, prompt, model, temperature, max_tokens, api_key):
-        import openai
-        client = openai.AsyncOpenAI(api_key=api_key)
-        stream = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=True
-        )
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+    async def _call_openai_compat(self, provider, prompt, model, temperature, max_tokens, api_key, json_mode):
+        base = OPENAI_COMPAT[provider]
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": {"type": "json_object"} if json_mode else None
+        }
+        try:
+            resp = await upstream.get(base).post(f"{base}/chat/completions", headers=headers, json=payload)
+        except httpx.TransportError as e:
+            raise UpstreamError(provider, None, str(e) or type(e).__name__)
+        if resp.status_code != 200:
+            raise await self._status_error(provider, api_key, resp.status_code, resp.headers, resp.text)
+        data = resp.json()
+        return Generation.from_usage(data["choices"][0]["message"]["content"], provider, model, prompt, data.get("usage"))
+
+    async def _call_mock(self, prompt, model, temperature, max_tokens, api_key, json_mode):
+        data = await mock_llm.complete(prompt, model, max_tokens, json_mode)
+        return Generation.from_usage(data["choices"][0]["message"]["content"], "mock", model, prompt, data["usage"])
+
+    async def _stream_openai_compat(self, provider, prompt, model, temperature, max_tokens, api_key):
+        """Incrementally yield deltas from an OpenAI-compatible SSE stream."""
+        base = OPENAI_COMPAT[provider]
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        try:
+            async with upstream.get(base).stream("POST", f"{base}/chat/completions", headers=headers, json=payload) as resp:
+                if resp.status_code != 200:
+                    body = (await resp.aread()).decode(errors="replace")
+                    raise await self._status_error(provider, api_key, resp.status_code, resp.headers, body)
+                async for delta in iter_chat_deltas(resp):
+                    yield delta
+        except httpx.TransportError as e:
+            raise UpstreamError(provider, None, str(e) or type(e).__name__)
+
+    async def _stream(self, provider, prompt, model, temperature, max_tokens, api_key):
+        """Admitted, health-tracked stream of deltas from any supported provider."""
+        if provider in OPENAI_COMPAT:
+            deltas = self._stream_openai_compat(provider, prompt, model, temperature, max_tokens, api_key)
+        else:
+            deltas = mock_llm.stream(prompt, model, max_tokens)
+        with router.dispatch(provider, model):
+            async with limits.acquire(provider, api_key, count_tokens(prompt, model) + max_tokens):
+                started = time.perf_counter()
+                ttft_ms = None
+                try:
+                    async for delta in deltas:
+                        if ttft_ms is None:
+                            ttft_ms = (time.perf_counter() - started) * 1000
+                        yield delta
+                except RateLimited:
+                    raise
+                except UpstreamError as e:
+                    if e.retryable:
+                        router.record_failure(provider, model, (time.perf_counter() - started) * 1000)
+                    raise
+            router.record_success(provider, model, (time.perf_counter() - started) * 1000, ttft_ms)
 
     def get_available_providers(self) -> List[str]:
-        return [p for p, key in self.global_keys.items() if key] + ["mock"]
+        return [p for p, key in self.global_keys.items() if key]
 
     async def list_models(self, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Return available providers and their default models.
 
         Note: this is a lightweight helper for UI.
         """
-        providers = []
-        for prov in self.global_keys.keys():
-            if await self._get_key(prov, user_id):
-                providers.append(prov)
+        providers = await self.resolve_providers(user_id)
         return {
-            "providers": providers,
+            "providers": list(providers),
             "default_models": self.default_models,
+            "capabilities": {p: info.capabilities for p, info in providers.items()},
         }
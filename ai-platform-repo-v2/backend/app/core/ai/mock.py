@@ -0,0 +1,222 @@
+"""Deterministic local LLM stand-in: the "mock" provider.
+
+Replies are a pure function of the prompt (same prompt, same text), while
+timing and failures follow a configurable profile: latency distribution,
+time to first token, streaming tokens/sec and an injected error rate. Used
+in-process by ``AIManager`` (provider="mock", ``AI_MOCK_ENABLED``) or served
+as a standalone OpenAI-compatible server for load tests::
+
+    python -m app.core.ai.mock --port 8100 --latency-ms 300 --error-rate 0.02
+
+and then point the app at it with ``AI_MOCK_BASE_URL=http://localhost:8100/v1``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from app.core.ai.errors import UpstreamError
+from app.core.ai.usage import count_tokens
+from app.core.config import settings
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+_VOCAB = (
+    "the model replies with a deterministic answer so that caches routing and load tests "
+    "can be measured without paying for real tokens every word here comes from a hash "
+    "of the prompt which keeps repeated runs comparable across machines and workers"
+).split()
+
+
+@dataclass(frozen=True)
+class MockProfile:
+    latency_ms: float = 200.0  # median time to a full (non-streaming) reply
+    distribution: str = "lognormal"  # fixed | uniform | lognormal
+    spread: float = 0.5  # uniform: +/- fraction of the median; lognormal: sigma
+    ttft_ms: float = 100.0  # median time to first streamed token
+    tokens_per_sec: float = 50.0
+    reply_tokens: int = 32  # words per reply, capped by max_tokens
+    error_rate: float = 0.0
+    error_status: int = 503
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_settings(cls) -> "MockProfile":
+        return cls(
+            latency_ms=settings.AI_MOCK_LATENCY_MS,
+            distribution=settings.AI_MOCK_DISTRIBUTION,
+            spread=settings.AI_MOCK_SPREAD,
+            ttft_ms=settings.AI_MOCK_TTFT_MS,
+            tokens_per_sec=settings.AI_MOCK_TOKENS_PER_SEC,
+            reply_tokens=settings.AI_MOCK_REPLY_TOKENS,
+            error_rate=settings.AI_MOCK_ERROR_RATE,
+            error_status=settings.AI_MOCK_ERROR_STATUS,
+            seed=settings.AI_MOCK_SEED,
+        )
+
+
+class MockLLM:
+    def __init__(self, profile: MockProfile):
+        if profile.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution: {profile.distribution}")
+        self.profile = profile
+        self._rng = random.Random(profile.seed)
+
+    def sample_ms(self, median_ms: float) -> float:
+        p = self.profile
+        if median_ms <= 0 or p.distribution == "fixed":
+            return max(0.0, median_ms)
+        if p.distribution == "uniform":
+            return max(0.0, self._rng.uniform(median_ms * (1 - p.spread), median_ms * (1 + p.spread)))
+        return self._rng.lognormvariate(0.0, p.spread) * median_ms
+
+    def _maybe_fail(self) -> None:
+        if self.profile.error_rate and self._rng.random() < self.profile.error_rate:
+            raise UpstreamError("mock", self.profile.error_status, "injected failure")
+
+    def pieces(self, prompt: str, max_tokens: int, json_mode: bool) -> List[str]:
+        """The reply split into streamable chunks; deterministic in the prompt."""
+        n = max(1, min(self.profile.reply_tokens, max_tokens))
+        digest = b""
+        seed = prompt.encode()
+        while len(digest) < n:
+            seed = hashlib.sha256(seed).digest()
+            digest += seed
+        words = [_VOCAB[b % len(_VOCAB)] for b in digest[:n]]
+        if not json_mode:
+            return [w if i == 0 else " " + w for i, w in enumerate(words)]
+        text = json.dumps(
+            {"mock": True, "prompt_sha": hashlib.sha256(prompt.encode()).hexdigest()[:12], "answer": " ".join(words)}
+        )
+        return [text[i:i + 8] for i in range(0, len(text), 8)]
+
+    async def complete(self, prompt: str, model: str = "mock", max_tokens: int = 4000, json_mode: bool = False) -> Dict[str, Any]:
+        """An OpenAI ``chat.completion`` body, after the sampled latency."""
+        await asyncio.sleep(self.sample_ms(self.profile.latency_ms) / 1000)
+        self._maybe_fail()
+        pieces = self.pieces(prompt, max_tokens, json_mode)
+        text = "".join(pieces)
+        prompt_tokens = count_tokens(prompt, model)
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(pieces),
+                "total_tokens": prompt_tokens + len(pieces),
+            },
+        }
+
+    async def stream(
+        self, prompt: str, model: str = "mock", max_tokens: int = 4000, json_mode: bool = False
+    ) -> AsyncGenerator[str, None]:
+        """Yield reply chunks: first after the sampled TTFT, then at ``tokens_per_sec``."""
+        await asyncio.sleep(self.sample_ms(self.profile.ttft_ms) / 1000)
+        self._maybe_fail()
+        interval = 1 / self.profile.tokens_per_sec if self.profile.tokens_per_sec > 0 else 0.0
+        for i, piece in enumerate(self.pieces(prompt, max_tokens, json_mode)):
+            if i and interval:
+                await asyncio.sleep(interval)
+            yield piece
+
+
+mock_llm = MockLLM(MockProfile.from_settings())
+
+
+def create_app(mock: MockLLM):
+    """Standalone OpenAI-compatible server around ``mock``."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="Mock LLM")
+
+    def _prompt(body: Dict[str, Any]) -> str:
+        return "\n".join(str(m.get("content") or "") for m in body.get("messages") or [])
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt, model = _prompt(body), body.get("model") or "mock"
+        max_tokens = int(body.get("max_tokens") or 4000)
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        error = {"error": {"message": "injected failure", "type": "mock_error"}}
+
+        if not body.get("stream"):
+            try:
+                return await mock.complete(prompt, model, max_tokens, json_mode)
+            except UpstreamError as e:
+                return JSONResponse(error, status_code=e.status)
+
+        chunks = mock.stream(prompt, model, max_tokens, json_mode)
+        try:
+            first = await chunks.__anext__()
+        except UpstreamError as e:
+            return JSONResponse(error, status_code=e.status)
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def events():
+            yield event({"role": "assistant", "content": first})
+            async for piece in chunks:
+                yield event({"content": piece})
+            yield event({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    defaults = MockProfile.from_settings()
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default=defaults.distribution)
+    parser.add_argument("--spread", type=float, default=defaults.spread)
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms)
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec)
+    parser.add_argument("--reply-tokens", type=int, default=defaults.reply_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    profile = replace(
+        defaults,
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        spread=args.spread,
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(MockLLM(profile)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
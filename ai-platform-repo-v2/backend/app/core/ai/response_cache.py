@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("bypass", "read", "write")
+
+
+def request_key(provider: str, model: str, prompt: str, temperature: float, max_tokens: int, json_mode: bool) -> str:
+    """Canonical hash of everything that determines a completion."""
+    canonical = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "prompt": prompt,
+            "temperature": float(temperature),
+            "max_tokens": int(max_tokens),
+            "json_mode": bool(json_mode),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def is_cacheable(temperature: float, json_mode: bool) -> bool:
+    """Only (near-)deterministic requests are worth replaying."""
+    return temperature == 0 or json_mode
+
+
+class ResponseCache:
+    """Exact-match completion cache: in-process LRU (L1) over Redis (L2).
+
+    L2 is used only when Redis is enabled; Redis errors degrade to L1-only.
+    """
+
+    def __init__(self):
+        self._l1 = TTLCache(maxsize=settings.AI_CACHE_L1_SIZE, ttl=settings.AI_CACHE_TTL)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._l1.get(key)
+        if value is not None:
+            metrics.inc("ai.response_cache.l1_hits")
+            return value
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(settings.AI_CACHE_REDIS_PREFIX + key)
+            except Exception as e:
+                logger.warning("response cache L2 read failed: %s", e)
+                raw = None
+            if raw is not None:
+                value = raw.decode()
+                self._l1.set(key, value)
+                metrics.inc("ai.response_cache.l2_hits")
+                return value
+
+        metrics.inc("ai.response_cache.misses")
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        self._l1.set(key, value)
+        metrics.inc("ai.response_cache.writes")
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(settings.AI_CACHE_REDIS_PREFIX + key, value, ex=int(settings.AI_CACHE_TTL))
+        except Exception as e:
+            logger.warning("response cache L2 write failed: %s", e)
+
+
+response_cache = ResponseCache()
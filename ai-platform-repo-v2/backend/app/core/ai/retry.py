@@ -0,0 +1,128 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from app.core.ai.errors import DeadlineExceeded, RateLimited, UpstreamError
+from app.core.config import settings
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+# Statuses worth repeating against the same provider; None = timeout/transport error.
+RETRY_STATUSES = {None, 408, 409, 429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the provider's Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(delay, retry_after or 0.0)
+
+
+def policy_for(provider: str) -> RetryPolicy:
+    conf = settings.AI_RETRY_POLICIES.get(provider, {})
+    return RetryPolicy(
+        max_attempts=int(conf.get("max_attempts", settings.AI_RETRY_MAX_ATTEMPTS)),
+        base_delay=float(conf.get("base_delay", settings.AI_RETRY_BASE_DELAY)),
+        max_delay=float(conf.get("max_delay", settings.AI_RETRY_MAX_DELAY)),
+    )
+
+
+def is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, UpstreamError) and not isinstance(exc, DeadlineExceeded) and exc.status in RETRY_STATUSES
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def _backoff_or_raise(provider: str, policy: RetryPolicy, attempt: int, exc: Exception, deadline: Optional[float]) -> None:
+    """Sleep before the next attempt, or re-raise ``exc`` if there should be none."""
+    if not is_retryable(exc) or attempt >= policy.max_attempts:
+        metrics.inc(f"ai.retry.attempts.{attempt}")
+        raise exc
+    delay = policy.backoff(attempt, exc.retry_after if isinstance(exc, RateLimited) else None)
+    remaining = _remaining(deadline)
+    if remaining is not None and delay >= remaining:
+        metrics.inc(f"ai.retry.attempts.{attempt}")
+        metrics.inc("ai.retry.deadline_exhausted")
+        raise exc
+    metrics.inc("ai.retry.retries")
+    await asyncio.sleep(delay)
+
+
+async def call_with_retries(provider: str, fn: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+    """Run ``fn`` until it succeeds, fails for good, or the deadline budget is spent.
+
+    ``deadline`` is a ``time.monotonic()`` timestamp; each attempt is cut off
+    when it passes (``DeadlineExceeded``).
+    """
+    policy = policy_for(provider)
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = _remaining(deadline)
+        try:
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError
+            result = await asyncio.wait_for(fn(), remaining)
+        except asyncio.TimeoutError:
+            metrics.inc(f"ai.retry.attempts.{attempt}")
+            metrics.inc("ai.retry.deadline_exceeded")
+            raise DeadlineExceeded(provider)
+        except UpstreamError as e:
+            await _backoff_or_raise(provider, policy, attempt, e, deadline)
+            continue
+        metrics.inc(f"ai.retry.attempts.{attempt}")
+        return result
+
+
+async def stream_with_retries(
+    provider: str, make_stream: Callable[[], AsyncIterator[str]], deadline: Optional[float] = None
+) -> AsyncGenerator[str, None]:
+    """Like ``call_with_retries`` for streams: only retried until the first chunk is out.
+
+    The deadline also bounds every wait for the next chunk, so a stream
+    that stalls mid-way ends with ``DeadlineExceeded`` too.
+    """
+    policy = policy_for(provider)
+    attempt = 0
+    while True:
+        attempt += 1
+        started = False
+        stream = make_stream()
+        try:
+            while True:
+                remaining = _remaining(deadline)
+                try:
+                    if remaining is not None and remaining <= 0:
+                        raise asyncio.TimeoutError
+                    chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    metrics.inc(f"ai.retry.attempts.{attempt}")
+                    metrics.inc("ai.retry.deadline_exceeded")
+                    raise DeadlineExceeded(provider)
+                started = True
+                yield chunk
+        except DeadlineExceeded:
+            raise
+        except UpstreamError as e:
+            if started:
+                raise
+            await _backoff_or_raise(provider, policy, attempt, e, deadline)
+            continue
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        metrics.inc(f"ai.retry.attempts.{attempt}")
+        return
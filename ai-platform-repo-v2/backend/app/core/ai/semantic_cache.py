@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (3, 4, 5)
+
+
+def embed(text: str, dim: int) -> np.ndarray:
+    """Hashed character n-gram embedding (L2-normalised, float32).
+
+    Runs on CPU with no model download, so the cache works offline; good
+    enough to spot near-duplicate prompts, not to judge meaning.
+    """
+    normalized = " " + " ".join(text.lower().split()) + " "
+    vec = np.zeros(dim, dtype=np.float32)
+    for n in NGRAM_SIZES:
+        for i in range(len(normalized) - n + 1):
+            h = zlib.crc32(normalized[i:i + n].encode())
+            vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm:
+        vec /= norm
+    return vec
+
+
+def scope_id(scope: str) -> int:
+    """64-bit digest of a scope string, for vectorised filtering; hits still compare the string."""
+    return int.from_bytes(hashlib.blake2b(scope.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+class SemanticIndex:
+    """Fixed-capacity cosine-similarity index over unit vectors.
+
+    Rows live in one preallocated matrix used as a ring buffer, so once
+    full the oldest entry is overwritten. Each row carries its scope string
+    and that string's 64-bit id; lookups only score rows with the caller's
+    scope id and drop any hit whose scope string differs (an id collision).
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._scope_keys: List[Optional[str]] = [None] * capacity
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vec: np.ndarray, scope: str, answer: str) -> None:
+        i = self._next
+        self._vectors[i] = vec
+        self._scopes[i] = scope_id(scope)
+        self._scope_keys[i] = scope
+        self._answers[i] = answer
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def search(self, vec: np.ndarray, scope: str, k: int = 1) -> List[Tuple[float, str]]:
+        """Top-k (similarity, answer) pairs within ``scope``, best first."""
+        n = self._size
+        if not n:
+            return []
+        rows = np.flatnonzero(self._scopes[:n] == scope_id(scope))
+        if not rows.size:
+            return []
+        if rows.size * 2 < n:
+            # Small scope (e.g. per-user): gather just its rows.
+            scores = self._vectors[rows] @ vec
+        else:
+            scores = (self._vectors[:n] @ vec)[rows]
+        if k == 1:
+            top = [int(scores.argmax())]
+        else:
+            k = min(k, scores.size)
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self._answers[rows[i]]) for i in top if self._scope_keys[rows[i]] == scope]
+
+
+class SemanticCache:
+    """Near-duplicate prompt cache in front of AIManager.generate."""
+
+    def __init__(self):
+        self._index: Optional[SemanticIndex] = None
+
+    @property
+    def index(self) -> SemanticIndex:
+        # Allocated lazily: the matrix is capacity x dim float32.
+        if self._index is None:
+            self._index = SemanticIndex(settings.AI_SEMANTIC_CACHE_SIZE, settings.AI_SEMANTIC_CACHE_DIM)
+        return self._index
+
+    def scope(self, provider: str, model: str, json_mode: bool, user_id: Optional[int]) -> str:
+        owner = f"user:{user_id}" if settings.AI_SEMANTIC_CACHE_SCOPE == "user" else "global"
+        return f"{owner}|{provider}|{model}|{int(bool(json_mode))}"
+
+    def lookup(self, prompt: str, scope: str) -> Optional[str]:
+        t0 = time.perf_counter()
+        matches = self.index.search(embed(prompt, self.index.dim), scope)
+        metrics.observe("ai.semantic_cache.lookup", (time.perf_counter() - t0) * 1000)
+        if matches and matches[0][0] >= settings.AI_SEMANTIC_CACHE_THRESHOLD:
+            metrics.inc("ai.semantic_cache.hits")
+            return matches[0][1]
+        metrics.inc("ai.semantic_cache.misses")
+        return None
+
+    def add(self, prompt: str, scope: str, answer: str) -> None:
+        self.index.add(embed(prompt, self.index.dim), scope, answer)
+        metrics.set_gauge("ai.semantic_cache.size", len(self.index))
+
+
+semantic_cache = SemanticCache()
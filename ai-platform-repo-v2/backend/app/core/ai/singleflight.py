@@ -0,0 +1,112 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Append-only chunk buffer shared by every subscriber of one stream."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesce identical in-flight upstream calls onto one task.
+
+    Concurrent callers with the same key await a single upstream future
+    (or read the same chunk sequence for streams). The upstream work is
+    cancelled only when its last waiter goes away.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            metrics.inc(f"{self.name}.coalesced")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncGenerator[str, None]:
+        bc = self._streams.get(key)
+        if bc is None:
+            bc = _Broadcast()
+            self._streams[key] = bc
+            bc.task = asyncio.ensure_future(self._pump(key, bc, fn))
+        else:
+            metrics.inc(f"{self.name}.coalesced_streams")
+
+        bc.subscribers += 1
+        i = 0
+        try:
+            while True:
+                while i < len(bc.chunks):
+                    yield bc.chunks[i]
+                    i += 1
+                if bc.done:
+                    if bc.error is not None:
+                        raise bc.error
+                    return
+                await bc.wait()
+        finally:
+            bc.subscribers -= 1
+            if bc.subscribers == 0 and not bc.task.done():
+                bc.task.cancel()
+
+    async def _pump(self, key: str, bc: _Broadcast, fn: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for chunk in fn():
+                bc.chunks.append(chunk)
+                bc.notify()
+        except asyncio.CancelledError:
+            bc.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            bc.error = e
+        finally:
+            bc.done = True
+            bc.notify()
+            self._forget(self._streams, key, bc)
+
+    @staticmethod
+    def _forget(registry: Dict, key: str, entry) -> None:
+        # A newer flight may already own the key; only drop our own entry.
+        if registry.get(key) is entry:
+            del registry[key]
+
+
+singleflight = SingleFlight("ai.singleflight")
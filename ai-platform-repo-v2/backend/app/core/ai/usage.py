@@ -0,0 +1,98 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact BPE counts for OpenAI-family models
+    tiktoken = None
+
+# USD per 1M (prompt, completion) tokens. Looked up by exact model name, then
+# by longest matching prefix; anything unknown is billed at DEFAULT_PRICE.
+PRICING: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "mixtral-8x7b-32768": (0.24, 0.24),
+    "llama-3.1-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "gemini-pro": (0.50, 1.50),
+    "deepseek-chat": (0.27, 1.10),
+    "mistral-large-latest": (2.00, 6.00),
+    "mock": (0.0, 0.0),
+}
+DEFAULT_PRICE: Tuple[float, float] = (1.00, 2.00)
+
+_WORD = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=64)
+def _encoding(model: str):
+    """Tokenizer per model name; only this lookup is cached, not per-text counts."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """Local token count for providers/streams that report no ``usage``.
+
+    Uses tiktoken when installed; otherwise approximates BPE at roughly one
+    token per punctuation mark and per 4 characters of a word.
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            return len(_encoding(model).encode(text))
+        except Exception:
+            pass
+    return sum((len(w) + 3) // 4 for w in _WORD.findall(text))
+
+
+def price(model: str) -> Tuple[float, float]:
+    if model in PRICING:
+        return PRICING[model]
+    prefix = max((m for m in PRICING if model.startswith(m)), key=len, default=None)
+    return PRICING[prefix] if prefix else DEFAULT_PRICE
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = price(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+@dataclass(frozen=True)
+class Generation:
+    """A completion plus the usage it should be billed for."""
+
+    text: str
+    provider: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    usage_reported: bool = True  # False: counted locally
+    cached: bool = False  # served from a response cache, no upstream cost
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        if self.cached:
+            return 0.0
+        return estimate_cost(self.model, self.prompt_tokens, self.completion_tokens)
+
+    @classmethod
+    def from_usage(
+        cls, text: str, provider: str, model: str, prompt: str, usage: Optional[Dict[str, Any]] = None, cached: bool = False
+    ) -> "Generation":
+        """Build from a provider ``usage`` block, counting locally when it is missing."""
+        if usage and usage.get("prompt_tokens") is not None and usage.get("completion_tokens") is not None:
+            return cls(text, provider, model, int(usage["prompt_tokens"]), int(usage["completion_tokens"]), True, cached)
+        return cls(text, provider, model, count_tokens(prompt, model), count_tokens(text or "", model), False, cached)
@@ -1,43 +1,443 @@
-from app.core.config import settings
-from typing import Optional, Dict, List
-from datetime import datetime
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from app.core.config import settings
+from app.core.db_pool import make_engine
+from app.core.cache import MISSING
+from app.core.metrics import metrics
+from app.core.shared_cache import SharedCache
+from typing import AsyncIterator, Awaitable, Callable, Optional, Dict, List
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import select, update, insert, delete, func, bindparam, union_all, text
+from sqlalchemy.exc import InterfaceError, OperationalError
 
-from app.models.db_models import Base, User, APIKey, Project, ProjectLog, Usage, Reminder, Notification, CalendarEvent, ChatThread, ChatMessage
-from app.core.security.auth import hash_password, verify_password
+from app.models.db_models import Base, User, APIKey, Project, ProjectLog, Usage, Reminder, Notification, CalendarEvent, ChatThread, ChatMessage, UsageHourly, UsageDaily
 from app.core.security.encryption import encrypt_key, decrypt_key
+from app.core.security.key_cache import key_cache
+from app.core.security.passwords import password_hasher
+from app.core.security.user_cache import user_cache
+from app.core.writebehind import AppendBuffer, CoalescingBuffer
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = settings.DATABASE_URL
 
 ASYNC_DB_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(ASYNC_DB_URL, echo=False, future=True)
+engine = make_engine(ASYNC_DB_URL)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Seconds a Postgres standby's replay trails the primary; 0 when fully caught up
+# (an idle primary leaves pg_last_xact_replay_timestamp() old without any lag)
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaRouter:
+    """Round-robin over the healthy read replicas in ``DATABASE_REPLICA_URLS``.
+
+    A background check connects to every replica each ``interval`` seconds;
+    one that fails, or (Postgres) replays more than ``max_lag`` seconds
+    behind, is out of rotation until a later check passes, as is one whose
+    connection breaks mid-query. Replicas start out of rotation until the
+    first check, and with none healthy ``pick()`` returns None so reads stay
+    on the primary.
+    """
+
+    def __init__(self, urls: List[str], interval: float, max_lag: float):
+        self.urls = urls
+        self.engines = [
+            make_engine(url.replace("postgresql://", "postgresql+asyncpg://"), prefix=f"db.replica{i}.pool")
+            for i, url in enumerate(urls)
+        ]
+        self.sessions = [sessionmaker(e, class_=AsyncSession, expire_on_commit=False) for e in self.engines]
+        self.interval = interval
+        self.max_lag = max_lag
+        self.healthy = [False] * len(self.engines)
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[int]:
+        n = len(self.engines)
+        for _ in range(n):
+            i = self._next % n
+            self._next += 1
+            if self.healthy[i]:
+                return i
+        return None
+
+    def _set_health(self, i: int, ok: bool, reason: str = "") -> None:
+        if ok != self.healthy[i]:
+            if ok:
+                logger.info("replica %d back in rotation", i)
+            else:
+                logger.warning("replica %d out of rotation: %s", i, reason)
+                metrics.inc("db.replicas.failures")
+        self.healthy[i] = ok
+        metrics.set_gauge("db.replicas.healthy", sum(self.healthy))
+
+    def mark_down(self, i: int, reason: str) -> None:
+        self._set_health(i, False, reason)
+
+    async def _probe(self, i: int) -> None:
+        async with self.engines[i].connect() as conn:
+            if self.engines[i].dialect.name == "postgresql":
+                lag = float((await conn.execute(_REPLICA_LAG_SQL)).scalar() or 0)
+                metrics.set_gauge(f"db.replica{i}.lag_s", lag)
+                if lag > self.max_lag:
+                    raise RuntimeError(f"replication lag {lag:.1f}s")
+            else:
+                await conn.execute(text("SELECT 1"))
+
+    async def check(self) -> None:
+        async def one(i: int) -> None:
+            try:
+                await asyncio.wait_for(self._probe(i), self.interval)
+            except Exception as e:
+                self._set_health(i, False, str(e) or type(e).__name__)
+            else:
+                self._set_health(i, True)
+
+        await asyncio.gather(*(one(i) for i in range(len(self.engines))))
+
+    def start(self) -> None:
+        if self._task is None and self.engines:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+
+replicas = ReplicaRouter(settings.replica_urls(), settings.DB_REPLICA_CHECK_INTERVAL, settings.DB_REPLICA_MAX_LAG)
+
+# user_id -> True for DB_READ_YOUR_WRITES_WINDOW seconds after the user's last commit;
+# shared through Redis (when enabled) so the next request may land on any worker
+recent_writes = SharedCache(
+    "recent writes", 100_000, settings.DB_READ_YOUR_WRITES_WINDOW, "ai:recentwrites:invalidate", redis_prefix="ai:wrote:"
+)
+
+
+async def _flush_last_used(batch: Dict) -> None:
+    """Apply buffered (user_id, provider) -> last_used touches in one executemany UPDATE."""
+    keys = APIKey.__table__
+    stmt = (
+        update(keys)
+        .where(keys.c.user_id == bindparam("b_user_id"), keys.c.provider == bindparam("b_provider"))
+        .values(last_used=bindparam("b_last_used"))
+    )
+    params = [
+        {"b_user_id": user_id, "b_provider": provider, "b_last_used": ts}
+        for (user_id, provider), ts in batch.items()
+    ]
+    async with AsyncSessionLocal() as session:
+        await session.execute(stmt, params)
+        await session.commit()
+
+
+last_used_buffer = CoalescingBuffer("api_keys.last_used", _flush_last_used, settings.LAST_USED_FLUSH_INTERVAL)
+
+
+def _iso(ts: Optional[datetime]) -> Optional[str]:
+    return ts.isoformat() if ts is not None else None
+
+
+def _dicts(result, datetimes: tuple = ("created_at",)) -> List[Dict]:
+    """Rows of a column-projected select as dicts, ``datetimes`` columns ISO-formatted.
+
+    Skips ORM entity hydration and identity-map bookkeeping: each row is a
+    plain tuple zipped with the result keys.
+    """
+    keys = list(result.keys())
+    out = []
+    for row in result:
+        d = dict(zip(keys, row))
+        for k in datetimes:
+            v = d[k]
+            if v is not None:
+                d[k] = v.isoformat()
+        out.append(d)
+    return out
+
+
+ROLLUP_KEY = ("bucket", "user_id", "provider", "endpoint")
+ROLLUP_SUMS = ("requests", "tokens", "cost")
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def _floor_hour(ts: datetime) -> datetime:
+    return _as_utc(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(ts: datetime) -> datetime:
+    return _floor_hour(ts).replace(hour=0)
+
+
+def _rollup(rows: List[Dict], floor) -> List[Dict]:
+    """Sum usage rows per (bucket, user, provider, endpoint)."""
+    acc: Dict[tuple, Dict] = {}
+    for row in rows:
+        key = (floor(row["created_at"]), row["user_id"], row["provider"], row["endpoint"] or "")
+        agg = acc.get(key)
+        if agg is None:
+            agg = acc[key] = dict(zip(ROLLUP_KEY, key), requests=0, tokens=0, cost=0.0)
+        agg["requests"] += 1
+        agg["tokens"] += row["tokens_used"]
+        agg["cost"] += row["cost_estimate"]
+    return list(acc.values())
+
+
+async def _upsert_rollup(session: AsyncSession, model, rows: List[Dict]) -> None:
+    table = model.__table__
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={c: table.c[c] + stmt.excluded[c] for c in ROLLUP_SUMS},
+    )
+    await session.execute(stmt)
+
+
+def _rollup_spans(start: datetime, end: datetime) -> List[tuple]:
+    """Cover [start, end) (widened to whole hours) with daily buckets where possible, hourly at the edges."""
+    lo, hi = _floor_hour(start), _floor_hour(end)
+    if hi < _as_utc(end):
+        hi += timedelta(hours=1)
+    day_lo, day_hi = _floor_day(lo), _floor_day(hi)
+    if day_lo < lo:
+        day_lo += timedelta(days=1)
+    if day_lo >= day_hi:
+        return [(UsageHourly, lo, hi)] if lo < hi else []
+    spans = [(UsageHourly, lo, day_lo), (UsageDaily, day_lo, day_hi), (UsageHourly, day_hi, hi)]
+    return [(model, a, b) for model, a, b in spans if a < b]
+
+
+async def _flush_usage(rows: List[Dict]) -> None:
+    """One multi-row INSERT for the batch, the hourly/daily rollup upserts and one
+    total_tokens UPDATE per user, all in one transaction."""
+    deltas: Dict[int, int] = {}
+    for row in rows:
+        deltas[row["user_id"]] = deltas.get(row["user_id"], 0) + row["tokens_used"]
+    users = User.__table__
+    stmt = (
+        update(users)
+        .where(users.c.id == bindparam("b_user_id"))
+        .values(total_tokens=users.c.total_tokens + bindparam("b_delta"))
+    )
+    # Sorted by user id so concurrent flushes from several workers lock rows in the same order
+    params = [{"b_user_id": user_id, "b_delta": delta} for user_id, delta in sorted(deltas.items()) if delta]
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Usage.__table__).values(rows))
+        await _upsert_rollup(session, UsageHourly, _rollup(rows, _floor_hour))
+        await _upsert_rollup(session, UsageDaily, _rollup(rows, _floor_day))
+        if params:
+            await session.execute(stmt, params)
+        await session.commit()
+    # /users/me is served from user_cache: drop the stale total_tokens
+    for user_id, _ in sorted(deltas.items()):
+        await user_cache.invalidate(user_id)
+
+
+usage_ledger = AppendBuffer(
+    "usage",
+    _flush_usage,
+    settings.USAGE_FLUSH_INTERVAL,
+    settings.USAGE_BATCH_SIZE,
+    settings.USAGE_QUEUE_MAX,
+    settings.USAGE_PUT_TIMEOUT,
+    settings.USAGE_SPOOL_PATH,
+)
+
+class UnitOfWork:
+    """One session (and transaction) shared by every ``Database`` call of a request.
+
+    Bound by ``unit_of_work()``; ``Database`` methods called from the owning
+    task join it instead of opening their own session, and their commits
+    become flushes. ``commit()`` ends the transaction early, e.g. before a
+    slow AI call, so no connection is held meanwhile: the session checks one
+    out again lazily on the next query. Cache invalidations registered with
+    ``_after_commit`` run only once the data they describe is committed.
+    """
+
+    def __init__(self):
+        self.session = AsyncSessionLocal()
+        self.owner = asyncio.current_task()
+        self._after_commit: List[Callable[[], Awaitable]] = []
+        self._pinned: List[object] = []  # the identity map is weak; keep checked rows around
+        self.wrote = False  # once set, reads stay on this session instead of a replica
+
+    async def commit(self) -> None:
+        await self.session.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            await callback()
+
+
+_uow: ContextVar[Optional[UnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+
+def _joined() -> Optional[UnitOfWork]:
+    """The current unit of work, unless we run in another task (those must not share the session)."""
+    uow = _uow.get()
+    if uow is not None and uow.owner is asyncio.current_task():
+        return uow
+    return None
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[UnitOfWork]:
+    """Commit on success, roll back on error; nested use joins the outer unit."""
+    outer = _joined()
+    if outer is not None:
+        yield outer
+        return
+    uow = UnitOfWork()
+    token = _uow.set(uow)
+    try:
+        yield uow
+        await uow.commit()
+    except BaseException:
+        await uow.session.rollback()
+        raise
+    finally:
+        _uow.reset(token)
+        await uow.session.close()
+
+
+@asynccontextmanager
+async def outside_unit_of_work() -> AsyncIterator[None]:
+    """Run a block on its own sessions, e.g. a slow AI call that must not hold the request's connection."""
+    token = _uow.set(None)
+    try:
+        yield
+    finally:
+        _uow.reset(token)
+
+
+@asynccontextmanager
+async def _session() -> AsyncIterator[AsyncSession]:
+    uow = _joined()
+    if uow is not None:
+        yield uow.session
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@asynccontextmanager
+async def _read_session(user_id: Optional[int] = None) -> AsyncIterator[AsyncSession]:
+    """Session for a read-only query: a replica when one is healthy, else ``_session()``.
+
+    Stays on the primary in a unit of work that has written (its reads must
+    see its own changes) and for ``user_id`` right after that user wrote.
+    """
+    i = None
+    uow = _joined()
+    if replicas.engines and not (uow is not None and uow.wrote):
+        i = replicas.pick()
+        if i is not None and user_id is not None and await recent_writes.get_shared(user_id) is not MISSING:
+            i = None
+    if i is None:
+        async with _session() as session:
+            yield session
+        return
+    metrics.inc("db.reads.replica")
+    try:
+        async with replicas.sessions[i]() as session:
+            yield session
+    except (OperationalError, InterfaceError, OSError) as e:
+        # Connection-level failure: skip the replica until a health check passes again
+        replicas.mark_down(i, str(e))
+        raise
+
+
+async def _commit(session: AsyncSession, user_id: Optional[int] = None) -> None:
+    """Commit (or flush, inside a unit of work); ``user_id`` starts that user's read-your-writes window."""
+    uow = _joined()
+    if uow is not None and uow.session is session:
+        uow.wrote = True
+        await session.flush()  # committed by the unit of work
+    else:
+        await session.commit()
+    if user_id is not None and replicas.engines:
+        await _after_commit(lambda: recent_writes.set_shared(user_id, True))
+
+
+async def _get_owned(session: AsyncSession, model, obj_id: int, user_id: int):
+    """``model`` row ``obj_id`` if it belongs to ``user_id``, else None.
+
+    Inside a unit of work the row stays pinned in the session, so repeated
+    ownership checks in the same request cost no further SELECT.
+    """
+    obj = await session.get(model, obj_id)
+    if obj is None or obj.user_id != user_id:
+        return None
+    uow = _joined()
+    if uow is not None and uow.session is session:
+        uow._pinned.append(obj)
+    return obj
+
+
+async def _after_commit(callback: Callable[[], Awaitable]) -> None:
+    uow = _joined()
+    if uow is not None:
+        uow._after_commit.append(callback)
+    else:
+        await callback()
+
+
 class Database:
     # ---------- Users ----------
     async def create_user(self, email: str, password: str, full_name: str = "") -> int:
-        async with AsyncSessionLocal() as session:
-            hashed = hash_password(password)
+        hashed = await password_hasher.hash(password)
+        async with _session() as session:
             user = User(email=email, password_hash=hashed, full_name=full_name)
             session.add(user)
-            await session.commit()
+            await session.flush()
+            await _commit(session, user.id)
             return user.id
 
     async def authenticate_user(self, email: str, password: str) -> Optional[Dict]:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(User).where(User.email == email))
-            user = result.scalar_one_or_none()
-            if user and verify_password(password, user.password_hash):
-                user.last_login = func.now()
-                await session.commit()
-                return {"id": user.id, "email": user.email, "is_admin": user.is_admin}
+        # The bcrypt verify may queue behind other logins: run it with no session open,
+        # so a login storm does not hold pooled connections while it waits
+        u = User.__table__
+        async with _session() as session:
+            user = (await session.execute(
+                select(u.c.id, u.c.email, u.c.password_hash, u.c.is_admin, u.c.is_active).where(u.c.email == email)
+            )).first()
+        if user is None:
             return None
+        valid, new_hash = await password_hasher.verify(password, user.password_hash)
+        if not valid:
+            return None
+        values = {"last_login": func.now()}
+        if new_hash:
+            values["password_hash"] = new_hash
+        async with _session() as session:
+            await session.execute(update(u).where(u.c.id == user.id).values(**values))
+            await _commit(session, user.id)
+        await _after_commit(lambda: user_cache.invalidate(user.id))
+        return {"id": user.id, "email": user.email, "is_admin": user.is_admin, "is_active": user.is_active}
 
     async def get_user(self, user_id: int) -> Optional[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             user = await session.get(User, user_id)
             if user:
                 return {
@@ -48,53 +448,44 @@ class Database:
                     "phone": user.phone,
                     "telegram_id": user.telegram_id,
                     "is_admin": user.is_admin,
+                    "is_active": user.is_active,
                     "balance": user.balance,
                     "total_projects": user.total_projects,
                     "total_tokens": user.total_tokens,
                     "settings": user.settings,
-                    "created_at": user.created_at.isoformat() if user.created_at else None,
-                    "last_login": user.last_login.isoformat() if user.last_login else None
+                    "created_at": _iso(user.created_at),
+                    "last_login": _iso(user.last_login)
                 }
             return None
 
     async def update_user_settings(self, user_id: int, settings: dict):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             await session.execute(
                 update(User).where(User.id == user_id).values(settings=settings)
             )
-            await session.commit()
+            await _commit(session, user_id)
+        await _after_commit(lambda: user_cache.invalidate(user_id))
 
     async def update_user(self, user_id: int, **kwargs):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             await session.execute(
                 update(User).where(User.id == user_id).values(**kwargs)
             )
-            await session.commit()
+            await _commit(session, user_id)
+        await _after_commit(lambda: user_cache.invalidate(user_id))
 
     async def list_users(self, q: str = "", limit: int = 100) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
-            stmt = select(User)
-            if q:
-                like = f"%{q.lower()}%"
-                stmt = stmt.where(func.lower(User.email).like(like) | func.lower(User.full_name).like(like))
-            stmt = stmt.order_by(User.created_at.desc()).limit(limit)
-            result = await session.execute(stmt)
-            users = result.scalars().all()
-            return [
-                {
-                    "id": u.id,
-                    "email": u.email,
-                    "full_name": u.full_name,
-                    "is_admin": u.is_admin,
-                    "is_active": u.is_active,
-                    "balance": u.balance,
-                    "created_at": u.created_at.isoformat() if u.created_at else None
-                }
-                for u in users
-            ]
+        u = User.__table__
+        stmt = select(u.c.id, u.c.email, u.c.full_name, u.c.is_admin, u.c.is_active, u.c.balance, u.c.created_at)
+        if q:
+            like = f"%{q.lower()}%"
+            stmt = stmt.where(func.lower(u.c.email).like(like) | func.lower(u.c.full_name).like(like))
+        stmt = stmt.order_by(u.c.created_at.desc()).limit(limit)
+        async with _read_session() as session:
+            return _dicts(await session.execute(stmt))
 
     async def get_user_by_telegram_id(self, telegram_id: str) -> Optional[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             result = await session.execute(select(User).where(User.telegram_id == telegram_id))
             u = result.scalar_one_or_none()
             if not u:
@@ -109,32 +500,43 @@ class Database:
                 "is_active": u.is_active,
                 "balance": u.balance,
                 "settings": u.settings,
-                "created_at": u.created_at.isoformat() if u.created_at else None,
-                "last_login": u.last_login.isoformat() if u.last_login else None
+                "created_at": _iso(u.created_at),
+                "last_login": _iso(u.last_login)
             }
 
     # ---------- API Keys ----------
     async def save_api_key(self, user_id: int, provider: str, api_key: str):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             encrypted = encrypt_key(api_key)
             key_entry = APIKey(user_id=user_id, provider=provider, encrypted_key=encrypted)
             session.add(key_entry)
-            await session.commit()
+            await _commit(session, user_id)
+        await _after_commit(lambda: key_cache.invalidate(user_id))
 
     async def get_api_key(self, user_id: int, provider: str) -> Optional[str]:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             result = await session.execute(
                 select(APIKey).where(APIKey.user_id == user_id, APIKey.provider == provider)
             )
             key_entry = result.scalar_one_or_none()
             if key_entry:
-                key_entry.last_used = func.now()
-                await session.commit()
                 return decrypt_key(key_entry.encrypted_key)
             return None
 
+    async def get_api_keys(self, user_id: int) -> Dict[str, str]:
+        """All of a user's decrypted keys as provider -> key, in one query."""
+        async with _session() as session:
+            result = await session.execute(
+                select(APIKey.provider, APIKey.encrypted_key).where(APIKey.user_id == user_id)
+            )
+            return {provider: decrypt_key(encrypted) for provider, encrypted in result.all()}
+
+    def touch_api_key_last_used(self, user_id: int, provider: str):
+        """Record key usage; persisted in bulk by ``last_used_buffer``."""
+        last_used_buffer.put((int(user_id), provider), datetime.now(timezone.utc))
+
     async def list_api_keys(self, user_id: int) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             result = await session.execute(
                 select(APIKey).where(APIKey.user_id == user_id)
             )
@@ -142,22 +544,23 @@ class Database:
             return [
                 {
                     "provider": k.provider,
-                    "created_at": k.created_at.isoformat() if k.created_at else None,
-                    "last_used": k.last_used.isoformat() if k.last_used else None
+                    "created_at": _iso(k.created_at),
+                    "last_used": _iso(k.last_used)
                 }
                 for k in keys
             ]
 
     async def delete_api_key(self, user_id: int, provider: str):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             await session.execute(
                 delete(APIKey).where(APIKey.user_id == user_id, APIKey.provider == provider)
             )
-            await session.commit()
+            await _commit(session, user_id)
+        await _after_commit(lambda: key_cache.invalidate(user_id))
 
     # ---------- Projects ----------
     async def create_project(self, user_id: int, config: dict) -> int:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             proj = Project(
                 user_id=user_id,
                 name=config.get("name", "Untitled"),
@@ -165,18 +568,19 @@ class Database:
                 config=config
             )
             session.add(proj)
-            await session.commit()
+            await _commit(session)
 
             await session.execute(
                 update(User).where(User.id == user_id).values(total_projects=User.total_projects + 1)
             )
-            await session.commit()
-            return proj.id
+            await _commit(session, user_id)
+        await _after_commit(lambda: user_cache.invalidate(user_id))
+        return proj.id
 
     async def get_project(self, project_id: int, user_id: int) -> Optional[Dict]:
-        async with AsyncSessionLocal() as session:
-            proj = await session.get(Project, project_id)
-            if proj and proj.user_id == user_id:
+        async with _session() as session:
+            proj = await _get_owned(session, Project, project_id, user_id)
+            if proj:
                 return {
                     "id": proj.id,
                     "name": proj.name,
@@ -187,105 +591,93 @@ class Database:
                     "github_url": proj.github_url,
                     "deploy_url": proj.deploy_url,
                     "deploy_platform": proj.deploy_platform,
-                    "created_at": proj.created_at.isoformat() if proj.created_at else None,
-                    "updated_at": proj.updated_at.isoformat() if proj.updated_at else None
+                    "created_at": _iso(proj.created_at),
+                    "updated_at": _iso(proj.updated_at)
                 }
             return None
 
     async def update_project(self, project_id: int, updates: dict):
-        async with AsyncSessionLocal() as session:
-            await session.execute(
-                update(Project).where(Project.id == project_id).values(**updates)
-            )
-            await session.commit()
+        async with _session() as session:
+            owner = (await session.execute(
+                update(Project).where(Project.id == project_id).values(**updates).returning(Project.user_id)
+            )).scalar()
+            await _commit(session, owner)
 
     async def delete_project(self, project_id: int, user_id: int):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             await session.execute(
                 delete(Project).where(Project.id == project_id, Project.user_id == user_id)
             )
-            await session.commit()
+            await _commit(session, user_id)
 
     async def list_projects(self, user_id: int) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(Project).where(Project.user_id == user_id).order_by(Project.created_at.desc())
-            )
-            projects = result.scalars().all()
-            return [
-                {
-                    "id": p.id,
-                    "name": p.name,
-                    "status": p.status,
-                    "created_at": p.created_at.isoformat() if p.created_at else None
-                }
-                for p in projects
-            ]
+        # Only the listed columns: config / files JSON can be large
+        p = Project.__table__
+        stmt = (
+            select(p.c.id, p.c.name, p.c.status, p.c.created_at)
+            .where(p.c.user_id == user_id)
+            .order_by(p.c.created_at.desc())
+        )
+        async with _read_session(user_id) as session:
+            return _dicts(await session.execute(stmt))
 
     async def add_log(self, project_id: int, log_type: str, message: str):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             log = ProjectLog(project_id=project_id, log_type=log_type, message=message)
             session.add(log)
-            await session.commit()
+            owner = None
+            if replicas.engines:  # only needed to start the owner's read-your-writes window
+                owner = (await session.execute(select(Project.user_id).where(Project.id == project_id))).scalar()
+            await _commit(session, owner)
 
     # ---------- Chats ----------
     async def create_thread(self, user_id: int, project_id: int, title: str) -> int:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             # Ensure project belongs to user
-            proj = await session.get(Project, project_id)
-            if not proj or proj.user_id != user_id:
+            proj = await _get_owned(session, Project, project_id, user_id)
+            if not proj:
                 raise ValueError("project not found")
             th = ChatThread(user_id=user_id, project_id=project_id, title=title or "Новый чат")
             session.add(th)
-            await session.commit()
+            await _commit(session, user_id)
             return th.id
 
     async def list_threads(self, user_id: int, project_id: Optional[int] = None, limit: int = 100) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
-            stmt = select(ChatThread).where(ChatThread.user_id == user_id)
-            if project_id is not None:
-                stmt = stmt.where(ChatThread.project_id == project_id)
-            stmt = stmt.order_by(ChatThread.created_at.desc()).limit(limit)
-            res = await session.execute(stmt)
-            items = res.scalars().all()
-            return [
-                {
-                    "id": t.id,
-                    "project_id": t.project_id,
-                    "title": t.title,
-                    "created_at": t.created_at.isoformat() if t.created_at else None,
-                    "updated_at": t.updated_at.isoformat() if t.updated_at else None,
-                }
-                for t in items
-            ]
+        t = ChatThread.__table__
+        stmt = select(t.c.id, t.c.project_id, t.c.title, t.c.created_at, t.c.updated_at).where(t.c.user_id == user_id)
+        if project_id is not None:
+            stmt = stmt.where(t.c.project_id == project_id)
+        stmt = stmt.order_by(t.c.created_at.desc()).limit(limit)
+        async with _read_session(user_id) as session:
+            return _dicts(await session.execute(stmt), ("created_at", "updated_at"))
 
     async def get_thread(self, user_id: int, thread_id: int) -> Optional[Dict]:
-        async with AsyncSessionLocal() as session:
-            th = await session.get(ChatThread, thread_id)
-            if not th or th.user_id != user_id:
+        async with _session() as session:
+            th = await _get_owned(session, ChatThread, thread_id, user_id)
+            if not th:
                 return None
             return {
                 "id": th.id,
                 "project_id": th.project_id,
                 "title": th.title,
-                "created_at": th.created_at.isoformat() if th.created_at else None,
-                "updated_at": th.updated_at.isoformat() if th.updated_at else None,
+                "created_at": _iso(th.created_at),
+                "updated_at": _iso(th.updated_at),
             }
 
     async def add_message(self, user_id: int, thread_id: int, role: str, content: str) -> int:
-        async with AsyncSessionLocal() as session:
-            th = await session.get(ChatThread, thread_id)
-            if not th or th.user_id != user_id:
+        async with _session() as session:
+            th = await _get_owned(session, ChatThread, thread_id, user_id)
+            if not th:
                 raise ValueError("thread not found")
             msg = ChatMessage(thread_id=thread_id, role=role, content=content)
             session.add(msg)
-            await session.commit()
+            await _commit(session, user_id)
             return msg.id
 
     async def list_messages(self, user_id: int, thread_id: int, limit: int = 200) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
-            th = await session.get(ChatThread, thread_id)
-            if not th or th.user_id != user_id:
+        async with _read_session(user_id) as session:
+            th = await _get_owned(session, ChatThread, thread_id, user_id)
+            if not th:
                 raise ValueError("thread not found")
             stmt = select(ChatMessage).where(ChatMessage.thread_id == thread_id).order_by(ChatMessage.created_at.asc()).limit(limit)
             res = await session.execute(stmt)
@@ -296,30 +688,26 @@ class Database:
                     "thread_id": m.thread_id,
                     "role": m.role,
                     "content": m.content,
-                    "created_at": m.created_at.isoformat() if m.created_at else None,
+                    "created_at": _iso(m.created_at),
                 }
                 for m in items
             ]
 
     # ---------- Usage ----------
     async def add_usage(self, user_id: int, provider: str, tokens: int, cost: float, endpoint: str = ""):
-        async with AsyncSessionLocal() as session:
-            usage = Usage(
-                user_id=user_id,
-                provider=provider,
-                tokens_used=tokens,
-                cost_estimate=cost,
-                endpoint=endpoint
-            )
-            session.add(usage)
-            await session.execute(
-                update(User).where(User.id == user_id).values(total_tokens=User.total_tokens + tokens)
-            )
-            await session.commit()
+        """Queue a usage row; written in bulk by ``usage_ledger`` (users.total_tokens lags by one flush)."""
+        await usage_ledger.put({
+            "user_id": user_id,
+            "provider": provider,
+            "tokens_used": tokens,
+            "cost_estimate": cost,
+            "endpoint": endpoint,
+            "created_at": datetime.now(timezone.utc),
+        })
 
     # ---------- Reminders ----------
     async def create_reminder(self, user_id: int, title: str, remind_at: datetime, description: str = "") -> int:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             rem = Reminder(
                 user_id=user_id,
                 title=title,
@@ -327,11 +715,11 @@ class Database:
                 remind_at=remind_at
             )
             session.add(rem)
-            await session.commit()
+            await _commit(session, user_id)
             return rem.id
 
     async def get_reminders(self, user_id: int, active_only: bool = True) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _read_session(user_id) as session:
             query = select(Reminder).where(Reminder.user_id == user_id)
             if active_only:
                 query = query.where(Reminder.is_active == True)
@@ -342,28 +730,28 @@ class Database:
                     "id": r.id,
                     "title": r.title,
                     "description": r.description,
-                    "remind_at": r.remind_at.isoformat() if r.remind_at else None,
+                    "remind_at": _iso(r.remind_at),
                     "is_active": r.is_active
                 }
                 for r in reminders
             ]
 
     async def delete_reminder(self, reminder_id: int, user_id: int):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             await session.execute(
                 delete(Reminder).where(Reminder.id == reminder_id, Reminder.user_id == user_id)
             )
-            await session.commit()
+            await _commit(session, user_id)
 
     # ---------- Notifications ----------
     async def create_notification(self, user_id: int, type: str, title: str, message: str):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             notif = Notification(user_id=user_id, type=type, title=title, message=message)
             session.add(notif)
-            await session.commit()
+            await _commit(session, user_id)
 
     async def get_notifications(self, user_id: int, unread_only: bool = False) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _read_session(user_id) as session:
             query = select(Notification).where(Notification.user_id == user_id)
             if unread_only:
                 query = query.where(Notification.is_read == False)
@@ -376,28 +764,28 @@ class Database:
                     "title": n.title,
                     "message": n.message,
                     "is_read": n.is_read,
-                    "created_at": n.created_at.isoformat() if n.created_at else None
+                    "created_at": _iso(n.created_at)
                 }
                 for n in notifs
             ]
 
     async def mark_notification_read(self, notif_id: int, user_id: int):
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             await session.execute(
                 update(Notification).where(Notification.id == notif_id, Notification.user_id == user_id).values(is_read=True)
             )
-            await session.commit()
+            await _commit(session, user_id)
 
     # ---------- Calendar ----------
     async def create_event(self, user_id: int, event_data: dict) -> int:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             event = CalendarEvent(user_id=user_id, **event_data)
             session.add(event)
-            await session.commit()
+            await _commit(session, user_id)
             return event.id
 
     async def get_events(self, user_id: int, start: datetime, end: datetime) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _read_session(user_id) as session:
             result = await session.execute(
                 select(CalendarEvent).where(
                     CalendarEvent.user_id == user_id,
@@ -411,33 +799,82 @@ class Database:
                     "id": e.id,
                     "title": e.title,
                     "description": e.description,
-                    "start_time": e.start_time.isoformat() if e.start_time else None,
-                    "end_time": e.end_time.isoformat() if e.end_time else None,
+                    "start_time": _iso(e.start_time),
+                    "end_time": _iso(e.end_time),
                     "location": e.location
                 }
                 for e in events
             ]
 
     # ---------- Admin / Logs ----------
-    async def get_usage(self, limit: int = 200) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(Usage).order_by(Usage.created_at.desc()).limit(limit))
-            rows = result.scalars().all()
-            return [
-                {
-                    "id": r.id,
-                    "user_id": r.user_id,
-                    "provider": r.provider,
-                    "tokens_used": r.tokens_used,
-                    "cost_estimate": r.cost_estimate,
-                    "endpoint": r.endpoint,
-                    "created_at": r.created_at.isoformat() if r.created_at else None,
-                }
-                for r in rows
-            ]
+    async def get_usage(self, limit: int = 200, days: Optional[int] = None) -> List[Dict]:
+        """Latest ``limit`` usage rows, optionally only those of the last ``days``."""
+        u = Usage.__table__
+        stmt = (
+            select(u.c.id, u.c.user_id, u.c.provider, u.c.tokens_used, u.c.cost_estimate, u.c.endpoint, u.c.created_at)
+            .order_by(u.c.created_at.desc())
+            .limit(limit)
+        )
+        if days is not None:
+            # A created_at lower bound lets Postgres prune to the last few partitions
+            stmt = stmt.where(u.c.created_at >= datetime.now(timezone.utc) - timedelta(days=days))
+        async with _read_session() as session:
+            return _dicts(await session.execute(stmt))
+
+    async def usage_totals(self, start: datetime, end: datetime, group_by: str, order_by: str = "cost", limit: int = 100) -> List[Dict]:
+        """Usage summed per ``group_by`` (user_id | provider | endpoint) over [start, end), from the rollups."""
+        parts = [
+            select(m.user_id, m.provider, m.endpoint, m.requests, m.tokens, m.cost).where(m.bucket >= lo, m.bucket < hi)
+            for m, lo, hi in _rollup_spans(start, end)
+        ]
+        if not parts:
+            return []
+        u = union_all(*parts).subquery()
+        key = u.c[group_by]
+        totals = (func.sum(u.c.requests).label("requests"), func.sum(u.c.tokens).label("tokens"), func.sum(u.c.cost).label("cost"))
+        order = {"requests": totals[0], "tokens": totals[1], "cost": totals[2]}[order_by]
+        stmt = select(key, *totals).group_by(key).order_by(order.desc()).limit(limit)
+        async with _read_session() as session:
+            rows = (await session.execute(stmt)).all()
+        return [
+            {group_by: r[0], "requests": int(r.requests or 0), "tokens": int(r.tokens or 0), "cost": float(r.cost or 0.0)}
+            for r in rows
+        ]
+
+    async def usage_series(
+        self, start: datetime, end: datetime, granularity: str = "hour", user_id: int | None = None, provider: str | None = None
+    ) -> List[Dict]:
+        """Requests/tokens/cost per hour or day bucket over [start, end), optionally for one user or provider."""
+        model, floor = (UsageHourly, _floor_hour) if granularity == "hour" else (UsageDaily, _floor_day)
+        stmt = (
+            select(
+                model.bucket,
+                func.sum(model.requests).label("requests"),
+                func.sum(model.tokens).label("tokens"),
+                func.sum(model.cost).label("cost"),
+            )
+            .where(model.bucket >= floor(start), model.bucket < _as_utc(end))
+            .group_by(model.bucket)
+            .order_by(model.bucket)
+        )
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        if provider:
+            stmt = stmt.where(model.provider == provider)
+        async with _read_session() as session:
+            rows = (await session.execute(stmt)).all()
+        return [
+            {
+                "bucket": _as_utc(r.bucket).isoformat(),
+                "requests": int(r.requests or 0),
+                "tokens": int(r.tokens or 0),
+                "cost": float(r.cost or 0.0),
+            }
+            for r in rows
+        ]
 
     async def admin_list_api_keys(self, user_id: int | None = None) -> List[Dict]:
-        async with AsyncSessionLocal() as session:
+        async with _session() as session:
             stmt = select(APIKey)
             if user_id is not None:
                 stmt = stmt.where(APIKey.user_id == user_id)
@@ -449,8 +886,8 @@ class Database:
                     "id": k.id,
                     "user_id": k.user_id,
                     "provider": k.provider,
-                    "created_at": k.created_at.isoformat() if k.created_at else None,
-                    "last_used": k.last_used.isoformat() if k.last_used else None,
+                    "created_at": _iso(k.created_at),
+                    "last_used": _iso(k.last_used),
                 }
                 for k in keys
             ]
@@ -0,0 +1,91 @@
+"""Async engine construction: pool sizing, pgbouncer mode and pool metrics.
+
+Postgres engines get a queue pool sized by the ``DB_POOL_*`` settings and
+instrumented under ``<prefix>.*`` in ``metrics``:
+
+- ``checked_out`` / ``overflow`` gauges: connections in use, and connections
+  open beyond ``DB_POOL_SIZE``
+- ``wait`` timing: how long a checkout took (queueing for a free connection
+  plus connecting a new one)
+- ``overflow_opened`` / ``timeouts`` counters: connections opened past the
+  pool size, and checkouts that gave up after ``DB_POOL_TIMEOUT``
+
+With ``DB_PGBOUNCER`` (transaction pooling) consecutive statements may run
+on different server connections, so asyncpg's prepared statement caches are
+disabled and every statement gets a unique name. SQLite keeps SQLAlchemy's
+default pool and only reports ``checked_out``.
+"""
+import time
+from uuid import uuid4
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+def _pool_class(prefix: str):
+    class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            t0 = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics.inc(f"{prefix}.timeouts")
+                raise
+            finally:
+                metrics.observe(f"{prefix}.wait", (time.perf_counter() - t0) * 1000)
+                metrics.set_gauge(f"{prefix}.overflow", max(0, self._overflow))
+
+        def _do_return_conn(self, record) -> None:
+            super()._do_return_conn(record)
+            metrics.set_gauge(f"{prefix}.overflow", max(0, self._overflow))
+
+        def _inc_overflow(self) -> bool:
+            # _overflow counts from -pool_size; above 0 the new connection is an overflow one
+            opened = super()._inc_overflow()
+            if opened and self._overflow > 0:
+                metrics.inc(f"{prefix}.overflow_opened")
+            return opened
+
+    return InstrumentedQueuePool
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def make_engine(url: str, prefix: str = "db.pool") -> AsyncEngine:
+    kwargs = {"echo": False, "future": True}
+    if url.startswith("postgresql+asyncpg://"):
+        kwargs.update(
+            poolclass=_pool_class(prefix),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE if settings.DB_POOL_RECYCLE > 0 else -1,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+        if settings.DB_PGBOUNCER:
+            kwargs["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _unique_statement_name,
+            }
+    engine = create_async_engine(url, **kwargs)
+
+    checked_out = [0]
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(*_):
+        checked_out[0] += 1
+        metrics.set_gauge(f"{prefix}.checked_out", checked_out[0])
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(*_):
+        checked_out[0] -= 1
+        metrics.set_gauge(f"{prefix}.checked_out", checked_out[0])
+
+    return engine
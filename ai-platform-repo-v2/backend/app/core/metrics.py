@@ -0,0 +1,52 @@
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+# Keep only the most recent samples per timing; enough for stable percentiles.
+_WINDOW = 2048
+
+
+def _percentile(ordered: list, p: float) -> float:
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+class Metrics:
+    """Tiny in-process metrics registry: counters, gauges and timings (ms)."""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=_WINDOW))
+        self._timing_counts: Dict[str, int] = defaultdict(int)
+
+    def inc(self, name: str, value: float = 1) -> None:
+        self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, ms: float) -> None:
+        self._timings[name].append(ms)
+        self._timing_counts[name] += 1
+
+    def timing(self, name: str) -> Dict[str, float]:
+        ordered = sorted(self._timings.get(name, ()))
+        return {
+            "count": self._timing_counts.get(name, 0),
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "p99": _percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "timings_ms": {name: self.timing(name) for name in self._timings},
+        }
+
+
+metrics = Metrics()
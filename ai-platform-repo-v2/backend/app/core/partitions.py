@@ -0,0 +1,147 @@
+"""Monthly partition upkeep for the append-only tables (see migration 0003).
+
+``usage`` and ``project_logs`` are range-partitioned by ``created_at`` into
+``<table>_pYYYYMM`` partitions (UTC months). ``PartitionMaintainer`` runs in
+every worker but does the work under a Postgres advisory lock, so only one
+of them runs each pass. Each pass pre-creates the next
+``PARTITION_MONTHS_AHEAD`` months and retires partitions older than the
+table's retention: they are dropped, or with ``PARTITION_RETENTION_MODE=detach``
+they are detached and left as standalone tables for archiving. Tables that
+are not partitioned (SQLite, ``create_all`` quick start) are skipped.
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant for pg_try_advisory_xact_lock
+_LOCK_KEY = 0x7061727473
+
+
+def month_start(ts: datetime) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    return datetime(ts.year, ts.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(ts: datetime, n: int) -> datetime:
+    months = ts.year * 12 + ts.month - 1 + n
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+class PartitionMaintainer:
+    def __init__(self, engine: AsyncEngine, tables: Dict[str, int], months_ahead: int, interval: float, mode: str):
+        if mode not in ("drop", "detach"):
+            raise ValueError(f"unknown partition retention mode: {mode}")
+        self.engine = engine
+        self.tables = tables
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.mode = mode
+        self._task: Optional[asyncio.Task] = None
+
+    async def _partitions(self, conn: AsyncConnection, table: str) -> Optional[List[datetime]]:
+        """Months of the attached partitions, or None if ``table`` is not partitioned."""
+        partitioned = await conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :t"),
+            {"t": table},
+        )
+        if partitioned.scalar() is None:
+            return None
+        rows = await conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :t"
+            ),
+            {"t": table},
+        )
+        pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})$")
+        months = []
+        for (name,) in rows:
+            m = pattern.match(name)
+            if m:
+                months.append(datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc))
+        return months
+
+    async def _maintain(self, conn: AsyncConnection, table: str, keep: int, now: datetime) -> None:
+        existing = await self._partitions(conn, table)
+        if existing is None:
+            return
+        current = month_start(now)
+        for i in range(self.months_ahead + 1):
+            month = add_months(current, i)
+            if month in existing:
+                continue
+            nxt = add_months(month, 1)
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{nxt:%Y-%m-%d} 00:00:00+00')"
+            ))
+            metrics.inc("partitions.created")
+            logger.info("created partition %s", partition_name(table, month))
+        if keep <= 0:
+            return
+        cutoff = add_months(current, -keep)
+        for month in sorted(m for m in existing if m < cutoff):
+            name = partition_name(table, month)
+            if self.mode == "detach":
+                await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                metrics.inc("partitions.detached")
+            else:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                metrics.inc("partitions.dropped")
+            logger.info("%s expired partition %s", "detached" if self.mode == "detach" else "dropped", name)
+
+    async def run_once(self, now: Optional[datetime] = None) -> None:
+        if self.engine.dialect.name != "postgresql":
+            return
+        now = now or datetime.now(timezone.utc)
+        async with self.engine.begin() as conn:
+            locked = await conn.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+            if not locked.scalar():
+                return
+            for table, keep in self.tables.items():
+                await self._maintain(conn, table, keep, now)
+
+    def start(self) -> None:
+        if self._task is None and self.engine.dialect.name == "postgresql":
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning("partition maintenance failed: %s", e)
+                metrics.inc("partitions.errors")
+            await asyncio.sleep(self.interval)
+
+
+# Months kept per table besides the current one; 0 keeps everything
+partition_maintainer = PartitionMaintainer(
+    engine,
+    {"usage": settings.USAGE_RETENTION_MONTHS, "project_logs": settings.PROJECT_LOGS_RETENTION_MONTHS},
+    settings.PARTITION_MONTHS_AHEAD,
+    settings.PARTITION_MAINTENANCE_INTERVAL,
+    settings.PARTITION_RETENTION_MODE,
+)
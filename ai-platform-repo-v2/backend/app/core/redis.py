@@ -0,0 +1,21 @@
+from app.core.config import settings
+
+_client = None
+
+
+def get_redis():
+    """Shared ``redis.asyncio`` client, or None when Redis is disabled."""
+    global _client
+    if not settings.REDIS_ENABLED:
+        return None
+    if _client is None:
+        import redis.asyncio as redis
+        _client = redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
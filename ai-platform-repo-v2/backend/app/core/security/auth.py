@@ -5,11 +5,12 @@ import time
 from typing import Any, Dict, Optional
 
 import jwt
-from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.security.passwords import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Blocking helpers for scripts; request handlers await password_hasher instead.
+pwd_context = password_hasher.context
 
 
 def hash_password(password: str) -> str:
@@ -20,11 +21,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def create_jwt(user_id: int, is_admin: bool = False) -> str:
+def create_jwt(user_id: int, is_admin: bool = False, is_active: bool = True) -> str:
     now = int(time.time())
     payload = {
         "user_id": user_id,
         "is_admin": bool(is_admin),
+        "is_active": bool(is_active),
         "iat": now,
         "exp": now + settings.JWT_EXPIRES_MINUTES * 60,
     }
@@ -0,0 +1,18 @@
+from app.core.config import settings
+from app.core.shared_cache import SharedCache
+
+
+class KeyCache(SharedCache):
+    """Per-user provider map (decrypted keys + defaults) keyed by user_id.
+
+    The whole map is cached, including "no user keys", so a request never
+    needs more than one ``api_keys`` query and no repeated decrypts.
+    Invalidations are broadcast over Redis pub/sub so other workers drop
+    their copy too. Decrypted keys never leave the process (no Redis L2).
+    """
+
+    def __init__(self):
+        super().__init__("key cache", settings.KEY_CACHE_SIZE, settings.KEY_CACHE_TTL, settings.KEY_CACHE_CHANNEL)
+
+
+key_cache = KeyCache()
@@ -0,0 +1,89 @@
+"""Password hashing off the event loop.
+
+bcrypt is deliberately slow (~100-300 ms at cost 12) and would stall every
+in-flight request if called from a coroutine. ``PasswordHasher`` runs it in
+a small dedicated thread pool (bcrypt releases the GIL), caps how many jobs
+may wait for a worker and rejects the rest right away with
+``PasswordHasherBusy`` instead of queueing logins without bound.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(RuntimeError):
+    """All hashing workers are busy and the wait queue is full."""
+
+
+def make_context(rounds: int) -> CryptContext:
+    # min == max == rounds: any stored hash with a different cost "needs update",
+    # so verify_and_update rehashes it on the next successful login.
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0  # queued + running
+
+    async def _run(self, op: str, fn: Callable[[], T]) -> T:
+        if self._pending >= self.workers + self.max_queue:
+            metrics.inc("auth.hash.rejected")
+            raise PasswordHasherBusy(f"password hasher saturated ({self._pending} jobs)")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._pending += 1
+        metrics.set_gauge("auth.hash.pending", self._pending)
+        queued = time.perf_counter()
+        started = queued
+
+        def job() -> T:
+            nonlocal started
+            started = time.perf_counter()
+            return fn()
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            done = time.perf_counter()
+            self._pending -= 1
+            metrics.set_gauge("auth.hash.pending", self._pending)
+            metrics.observe("auth.hash.wait", (started - queued) * 1000)
+            metrics.observe(f"auth.hash.{op}", (done - started) * 1000)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", lambda: self.context.hash(password))
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """``(valid, new_hash)``; ``new_hash`` is set when the stored hash's cost is outdated."""
+        valid, new_hash = await self._run("verify", lambda: self.context.verify_and_update(password, hashed))
+        if new_hash:
+            metrics.inc("auth.hash.rehashed")
+        return valid, new_hash
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    make_context(settings.BCRYPT_ROUNDS), settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE
+)
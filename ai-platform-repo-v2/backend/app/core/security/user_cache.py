@@ -0,0 +1,25 @@
+from app.core.config import settings
+from app.core.shared_cache import SharedCache
+
+
+class UserCache(SharedCache):
+    """``Database.get_user`` dicts keyed by user_id, for ``get_current_user``.
+
+    Read-through: in-process first, then Redis (when enabled), then the
+    database. Dropped on every worker by ``update_user`` /
+    ``update_user_settings`` (and so by the admin flags endpoint), by logins
+    and new projects, and for each user in a usage-ledger flush, so
+    ``/users/me`` can serve it as is.
+    """
+
+    def __init__(self):
+        super().__init__(
+            "user cache",
+            settings.USER_CACHE_SIZE,
+            settings.USER_CACHE_TTL,
+            settings.USER_CACHE_CHANNEL,
+            redis_prefix=settings.USER_CACHE_REDIS_PREFIX,
+        )
+
+
+user_cache = UserCache()
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+from typing import Any, Optional
+
+from app.core.cache import TTLCache, MISSING
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """In-process TTL cache keyed by user_id, kept coherent across workers.
+
+    ``invalidate`` drops the local entry and broadcasts the id over a Redis
+    pub/sub ``channel`` so every worker's listener drops its copy too. With a
+    ``redis_prefix`` values (JSON-serialisable only) are also written through
+    to Redis as a shared L2 with the same TTL.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, channel: str, redis_prefix: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.channel = channel
+        self.redis_prefix = redis_prefix
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._listener: Optional[asyncio.Task] = None
+
+    def get(self, user_id: int) -> Any:
+        """Return the locally cached value or ``MISSING``."""
+        return self._cache.get(int(user_id), MISSING)
+
+    def set(self, user_id: int, value: Any) -> None:
+        self._cache.set(int(user_id), value)
+
+    async def get_shared(self, user_id: int) -> Any:
+        """Local value, else the Redis L2 value (promoted to local), else ``MISSING``."""
+        value = self.get(user_id)
+        redis = get_redis()
+        if value is not MISSING or self.redis_prefix is None or redis is None:
+            return value
+        try:
+            raw = await redis.get(f"{self.redis_prefix}{int(user_id)}")
+        except Exception as e:
+            logger.warning("%s L2 read failed: %s", self.name, e)
+            return MISSING
+        if raw is None:
+            return MISSING
+        value = json.loads(raw)
+        self.set(user_id, value)
+        return value
+
+    async def set_shared(self, user_id: int, value: Any) -> None:
+        self.set(user_id, value)
+        redis = get_redis()
+        if self.redis_prefix is None or redis is None:
+            return
+        try:
+            await redis.set(f"{self.redis_prefix}{int(user_id)}", json.dumps(value), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            logger.warning("%s L2 write failed: %s", self.name, e)
+
+    async def invalidate(self, user_id: int) -> None:
+        self._cache.pop(int(user_id))
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            if self.redis_prefix is not None:
+                await redis.delete(f"{self.redis_prefix}{int(user_id)}")
+            await redis.publish(self.channel, str(int(user_id)))
+        except Exception as e:
+            logger.warning("%s invalidation broadcast failed: %s", self.name, e)
+
+    def start(self) -> None:
+        if self._listener is None and get_redis() is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self._cache.pop(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("%s listener error, reconnecting: %s", self.name, e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
@@ -0,0 +1,234 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingBuffer:
+    """Write-behind buffer that keeps only the latest value per key.
+
+    Values are flushed in one batch every ``interval`` seconds and on
+    shutdown. A failed flush puts the batch back (without overwriting newer
+    values) so the next run retries it.
+    """
+
+    def __init__(self, name: str, flush: Callable[[Dict[Hashable, Any]], Awaitable[None]], interval: float):
+        self.name = name
+        self.interval = interval
+        self._flush = flush
+        self._pending: Dict[Hashable, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._pending[key] = value
+        metrics.set_gauge(f"{self.name}.buffer_size", len(self._pending))
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        t0 = time.perf_counter()
+        try:
+            await self._flush(batch)
+        except Exception as e:
+            logger.warning("%s flush of %d rows failed: %s", self.name, len(batch), e)
+            metrics.inc(f"{self.name}.flush_errors")
+            for key, value in batch.items():
+                self._pending.setdefault(key, value)
+        else:
+            metrics.inc(f"{self.name}.flushed_rows", len(batch))
+        finally:
+            metrics.observe(f"{self.name}.flush", (time.perf_counter() - t0) * 1000)
+            metrics.set_gauge(f"{self.name}.buffer_size", len(self._pending))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+class AppendBuffer:
+    """Write-behind queue for append-only rows (e.g. the usage ledger).
+
+    Rows are flushed in batches of up to ``batch_size`` every ``interval``
+    seconds, or as soon as a full batch is waiting. Once ``max_size`` rows
+    are pending, ``put`` applies backpressure: the producer waits (at most
+    ``put_timeout`` seconds) for a flush to make room. A row is never
+    dropped: past the timeout it is queued anyway and counted as overflow.
+    A failed flush puts the batch back in front for the next run. On
+    shutdown whatever cannot be written is spooled to a file of its own
+    next to ``spool_path`` (JSON lines, ``<spool_path>.<pid>-<ns>``) and
+    replayed on the next start. Workers sharing the path never write the
+    same file, and each spool file is claimed with an atomic rename before
+    it is read, so concurrent starts cannot replay (and bill) a row twice.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        interval: float,
+        batch_size: int,
+        max_size: int,
+        put_timeout: float,
+        spool_path: Optional[str] = None,
+    ):
+        self.name = name
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.max_size = max(self.batch_size, max_size)
+        self.put_timeout = put_timeout
+        self.spool_path = spool_path
+        self._flush = flush
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _gauge(self) -> None:
+        metrics.set_gauge(f"{self.name}.buffer_size", len(self._pending))
+
+    async def put(self, row: Dict[str, Any]) -> None:
+        if len(self._pending) >= self.max_size:
+            metrics.inc(f"{self.name}.backpressure_waits")
+            self._wakeup.set()
+            t0 = time.perf_counter()
+            try:
+                async with self._room:
+                    await asyncio.wait_for(
+                        self._room.wait_for(lambda: len(self._pending) < self.max_size), self.put_timeout
+                    )
+            except asyncio.TimeoutError:
+                metrics.inc(f"{self.name}.overflow")
+            metrics.observe(f"{self.name}.backpressure_wait", (time.perf_counter() - t0) * 1000)
+        self._pending.append(row)
+        self._gauge()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> bool:
+        """Write everything pending; False if a batch failed (it stays queued)."""
+        async with self._lock:
+            while self._pending:
+                n = min(self.batch_size, len(self._pending))
+                batch = [self._pending.popleft() for _ in range(n)]
+                t0 = time.perf_counter()
+                try:
+                    await self._flush(batch)
+                except Exception as e:
+                    logger.warning("%s flush of %d rows failed: %s", self.name, len(batch), e)
+                    metrics.inc(f"{self.name}.flush_errors")
+                    self._pending.extendleft(reversed(batch))
+                    return False
+                finally:
+                    metrics.observe(f"{self.name}.flush", (time.perf_counter() - t0) * 1000)
+                    self._gauge()
+                metrics.inc(f"{self.name}.flushed_rows", len(batch))
+                async with self._room:
+                    self._room.notify_all()
+            return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._replay_spool()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, attempts: int = 3) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for attempt in range(attempts):
+            if await self.flush():
+                return
+            await asyncio.sleep(0.5 * (attempt + 1))
+        self._spool()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _spool(self) -> None:
+        if not self._pending:
+            return
+        if not self.spool_path:
+            logger.error("%s: dropping %d unflushed rows on shutdown (no spool path)", self.name, len(self._pending))
+            return
+        path = f"{self.spool_path}.{os.getpid()}-{time.time_ns()}"
+        # Written under a name replay ignores, then published whole.
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for row in self._pending:
+                f.write(json.dumps(row, default=_encode) + "\n")
+        os.replace(path + ".tmp", path)
+        logger.warning("%s: spooled %d unflushed rows to %s", self.name, len(self._pending), path)
+        self._pending.clear()
+        self._gauge()
+
+    def _spool_files(self) -> List[str]:
+        """Published spool files: this buffer's per-process ones, plus a legacy shared file."""
+        files = [
+            p for p in glob.glob(glob.escape(self.spool_path) + ".*")
+            if not p.endswith(".tmp") and ".replay-" not in p
+        ]
+        if os.path.exists(self.spool_path):
+            files.append(self.spool_path)
+        return sorted(files)
+
+    def _replay_spool(self) -> None:
+        if not self.spool_path:
+            return
+        rows: List[Dict[str, Any]] = []
+        for path in self._spool_files():
+            claimed = f"{path}.replay-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # another worker claimed it first
+            with open(claimed, encoding="utf-8") as f:
+                rows.extend(json.loads(line, object_hook=_decode) for line in f if line.strip())
+            os.remove(claimed)
+        if rows:
+            self._pending.extendleft(reversed(rows))
+            self._gauge()
+            logger.info("%s: replaying %d spooled rows", self.name, len(rows))
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    raise TypeError(f"cannot spool {type(value).__name__}")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if set(obj) == {"__dt__"}:
+        return datetime.fromisoformat(obj["__dt__"])
+    return obj
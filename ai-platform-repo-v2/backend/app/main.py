@@ -1,9 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.core.config import settings
-from app.core.database import init_db, Database
+from app.core.database import init_db, Database, last_used_buffer, usage_ledger, replicas
+from app.core.ai.errors import DeadlineExceeded, RateLimited, UpstreamError
+from app.core.ai.http import upstream
+from app.core.partitions import partition_maintainer
+from app.core.redis import close_redis
+from app.core.security.key_cache import key_cache
+from app.core.security.passwords import PasswordHasherBusy, password_hasher
+from app.core.security.user_cache import user_cache
 from app.api.v1.api import api_router
 
 app = FastAPI(title="AI Developer Platform API", version="5.0")
@@ -23,6 +31,29 @@ app.include_router(api_router, prefix="/api/v1")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))} if exc.retry_after else None
+    return JSONResponse(status_code=429, content={"detail": f"Провайдер {exc.provider} перегружен, повторите позже"}, headers=headers)
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": f"Провайдер {exc.provider} не ответил вовремя"})
+
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    # Retries ran out on a 5xx/network failure, or the provider refused the request.
+    status_code = exc.status if exc.status is not None and exc.status >= 500 else 502
+    return JSONResponse(status_code=status_code, content={"detail": f"Ошибка провайдера {exc.provider}, повторите позже"})
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(status_code=503, content={"detail": "Сервер перегружен, повторите вход позже"}, headers={"Retry-After": "1"})
+
+
 @app.get("/api/v1/health", tags=["health"])
 async def health():
     return {"ok": True}
@@ -32,6 +63,12 @@ async def health():
 async def on_startup():
     # Create tables for quick start (migrations recommended for production)
     await init_db()
+    key_cache.start()
+    user_cache.start()
+    last_used_buffer.start()
+    usage_ledger.start()
+    partition_maintainer.start()
+    replicas.start()
 
     # Bootstrap admin if provided
     if settings.ADMIN_EMAIL and settings.ADMIN_PASSWORD:
@@ -45,3 +82,17 @@ async def on_startup():
             except Exception:
                 # likely already exists with different password
                 pass
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Release pooled upstream AI clients, flush write-behind buffers, stop listeners
+    await upstream.aclose()
+    await partition_maintainer.stop()
+    await replicas.stop()
+    await last_used_buffer.stop()
+    await usage_ledger.stop()
+    await key_cache.stop()
+    await user_cache.stop()
+    password_hasher.close()
+    await close_redis()
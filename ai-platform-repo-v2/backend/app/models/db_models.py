@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, JSON, Boolean, BigInteger
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, JSON, Boolean, BigInteger, UniqueConstraint, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -7,6 +7,7 @@ Base = declarative_base()
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_created_at", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -43,6 +44,10 @@ class User(Base):
 
 class APIKey(Base):
     __tablename__ = "api_keys"
+    __table_args__ = (
+        Index("ix_api_keys_user_provider", "user_id", "provider"),
+        Index("ix_api_keys_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -55,6 +60,7 @@ class APIKey(Base):
 
 class Usage(Base):
     __tablename__ = "usage"
+    __table_args__ = (Index("ix_usage_user_id_created_at", "user_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -62,12 +68,14 @@ class Usage(Base):
     tokens_used = Column(Integer, nullable=False)
     cost_estimate = Column(Float, nullable=False)
     endpoint = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key (monthly ranges, migration 0003)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
 
     user = relationship("User", back_populates="usage")
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (Index("ix_projects_user_id_created_at", "user_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -87,17 +95,26 @@ class Project(Base):
 
 class ProjectLog(Base):
     __tablename__ = "project_logs"
+    __table_args__ = (Index("ix_project_logs_project_id_created_at", "project_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
     log_type = Column(String, nullable=False)
     message = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key (monthly ranges, migration 0003)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     project = relationship("Project", back_populates="logs")
 
 class Reminder(Base):
     __tablename__ = "reminders"
+    __table_args__ = (
+        Index("ix_reminders_user_id_remind_at", "user_id", "remind_at"),
+        Index(
+            "ix_reminders_active_user_id_remind_at", "user_id", "remind_at",
+            postgresql_where=text("is_active"), sqlite_where=text("is_active = 1"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -111,6 +128,13 @@ class Reminder(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+        Index(
+            "ix_notifications_unread_user_id_created_at", "user_id", "created_at",
+            postgresql_where=text("NOT is_read"), sqlite_where=text("is_read = 0"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -124,6 +148,7 @@ class Notification(Base):
 
 class CalendarEvent(Base):
     __tablename__ = "calendar_events"
+    __table_args__ = (Index("ix_calendar_events_user_id_start_time", "user_id", "start_time"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -139,6 +164,10 @@ class CalendarEvent(Base):
 
 class ChatThread(Base):
     __tablename__ = "chat_threads"
+    __table_args__ = (
+        Index("ix_chat_threads_user_id_created_at", "user_id", "created_at"),
+        Index("ix_chat_threads_user_id_project_id_created_at", "user_id", "project_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -150,9 +179,40 @@ class ChatThread(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (Index("ix_chat_messages_thread_id_created_at", "thread_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     thread_id = Column(Integer, ForeignKey("chat_threads.id"), nullable=False, index=True)
     role = Column(String, nullable=False)  # user|assistant|system
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UsageHourly(Base):
+    """Usage rolled up per UTC hour; maintained by the usage ledger flush."""
+    __tablename__ = "usage_hourly"
+    __table_args__ = (UniqueConstraint("bucket", "user_id", "provider", "endpoint", name="uq_usage_hourly_key"),)
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    provider = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False, default="")
+    requests = Column(Integer, nullable=False, default=0)
+    tokens = Column(BigInteger, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0.0)
+
+
+class UsageDaily(Base):
+    """Usage rolled up per UTC day; maintained by the usage ledger flush."""
+    __tablename__ = "usage_daily"
+    __table_args__ = (UniqueConstraint("bucket", "user_id", "provider", "endpoint", name="uq_usage_daily_key"),)
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    provider = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False, default="")
+    requests = Column(Integer, nullable=False, default=0)
+    tokens = Column(BigInteger, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0.0)
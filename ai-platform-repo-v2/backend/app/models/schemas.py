@@ -11,6 +11,12 @@ class GenerateRequest(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 4000
     json_mode: bool = False
+    # Response cache: bypass = off, read = read-through, write = regenerate and overwrite.
+    # None follows AI_CACHE_ENABLED. Only temperature=0 / json_mode requests are cached
+    # exactly; the semantic cache (AI_SEMANTIC_CACHE_ENABLED) honours the same modes.
+    cache: Optional[Literal["bypass", "read", "write"]] = None
+    # Auto mode only: if the chosen provider is slower than its p95, race the next one.
+    hedge: bool = False
 
 class EmbeddingsRequest(BaseModel):
     texts: List[str]
@@ -0,0 +1,180 @@
+"""Micro-benchmark: ORM entity hydration vs. column-projected selects for the list reads.
+
+Run from ``backend/``::
+
+    python -m benchmarks.list_serialization --rows 10000 --repeat 7
+
+Seeds ``--rows`` users, projects (with ``--config-kb`` of JSON in
+``config`` and ``files``), chat threads and usage rows into a temporary
+SQLite database (``--database-url`` for Postgres). Each list read is then
+run two ways: "orm" loads full entities with ``select(Model)`` and builds
+the dicts by hand, as ``Database`` used to; "projected" is the current
+``Database`` method (Core select of the returned columns, ``_dicts``). Both
+return identical results. Reports the median latency and, in a separate
+traced run, the peak Python memory allocated during the call (tracemalloc).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+
+async def seed(engine, args) -> int:
+    from sqlalchemy import insert
+
+    from app.models.db_models import ChatThread, Project, Usage, User
+
+    now = datetime.now(timezone.utc)
+    blob = {"notes": "x" * (args.config_kb * 1024)}
+    users = [
+        {"id": i, "email": f"user{i}@example.com", "password_hash": "-", "full_name": f"User {i}",
+         "created_at": now - timedelta(seconds=i)}
+        for i in range(1, args.rows + 1)
+    ]
+    owner = 1
+    projects = [
+        {"id": i, "user_id": owner, "name": f"project {i}", "description": "d", "config": blob, "files": blob,
+         "created_at": now - timedelta(seconds=i)}
+        for i in range(1, args.rows + 1)
+    ]
+    threads = [
+        {"user_id": owner, "project_id": 1, "title": f"thread {i}", "created_at": now - timedelta(seconds=i),
+         "updated_at": now}
+        for i in range(1, args.rows + 1)
+    ]
+    usage = [
+        {"user_id": owner, "provider": "openai", "tokens_used": i % 2000, "cost_estimate": 0.001,
+         "endpoint": "/ai/generate", "created_at": now - timedelta(seconds=i)}
+        for i in range(1, args.rows + 1)
+    ]
+    async with engine.begin() as conn:
+        for model, rows in ((User, users), (Project, projects), (ChatThread, threads), (Usage, usage)):
+            for i in range(0, len(rows), 2000):
+                await conn.execute(insert(model.__table__), rows[i:i + 2000])
+    return owner
+
+
+def orm_reads(session_factory, n: int):
+    """The pre-projection implementations: full entities, dicts built by hand."""
+    from sqlalchemy import select
+
+    from app.models.db_models import ChatThread, Project, Usage, User
+
+    def iso(ts):
+        return ts.isoformat() if ts else None
+
+    async def list_users():
+        async with session_factory() as session:
+            users = (await session.execute(select(User).order_by(User.created_at.desc()).limit(n))).scalars().all()
+            return [
+                {"id": u.id, "email": u.email, "full_name": u.full_name, "is_admin": u.is_admin,
+                 "is_active": u.is_active, "balance": u.balance, "created_at": iso(u.created_at)}
+                for u in users
+            ]
+
+    async def list_projects(user_id):
+        async with session_factory() as session:
+            stmt = select(Project).where(Project.user_id == user_id).order_by(Project.created_at.desc())
+            projects = (await session.execute(stmt)).scalars().all()
+            return [{"id": p.id, "name": p.name, "status": p.status, "created_at": iso(p.created_at)} for p in projects]
+
+    async def list_threads(user_id):
+        async with session_factory() as session:
+            stmt = select(ChatThread).where(ChatThread.user_id == user_id).order_by(ChatThread.created_at.desc()).limit(n)
+            items = (await session.execute(stmt)).scalars().all()
+            return [
+                {"id": t.id, "project_id": t.project_id, "title": t.title, "created_at": iso(t.created_at),
+                 "updated_at": iso(t.updated_at)}
+                for t in items
+            ]
+
+    async def get_usage():
+        async with session_factory() as session:
+            stmt = select(Usage).order_by(Usage.created_at.desc()).limit(n)
+            rows = (await session.execute(stmt)).scalars().all()
+            return [
+                {"id": r.id, "user_id": r.user_id, "provider": r.provider, "tokens_used": r.tokens_used,
+                 "cost_estimate": r.cost_estimate, "endpoint": r.endpoint, "created_at": iso(r.created_at)}
+                for r in rows
+            ]
+
+    return list_users, list_projects, list_threads, get_usage
+
+
+async def measure(call, repeat: int) -> dict:
+    await call()  # warm up statement caches and the connection
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await call()
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    result = await call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50_ms": statistics.median(times),
+        "peak_mb": peak / 2**20,
+        "rows": len(result),
+        "result": result,
+    }
+
+
+async def run(args) -> None:
+    from app.core.database import AsyncSessionLocal, Database, engine, init_db
+
+    await init_db()
+    t0 = time.perf_counter()
+    owner = await seed(engine, args)
+    print(f"seeded 4 x {args.rows} rows in {time.perf_counter() - t0:.1f}s (config/files {args.config_kb} KB each)")
+
+    db = Database()
+    n = args.rows
+    orm_users, orm_projects, orm_threads, orm_usage = orm_reads(AsyncSessionLocal, n)
+    cases = [
+        ("list_users", orm_users, lambda: db.list_users(limit=n)),
+        ("list_projects", lambda: orm_projects(owner), lambda: db.list_projects(owner)),
+        ("list_threads", lambda: orm_threads(owner), lambda: db.list_threads(owner, limit=n)),
+        ("get_usage", orm_usage, lambda: db.get_usage(limit=n)),
+    ]
+    for name, orm, projected in cases:
+        before = await measure(orm, args.repeat)
+        after = await measure(projected, args.repeat)
+        assert before["result"] == after["result"], f"{name}: results differ"
+        for label, r in (("orm", before), ("projected", after)):
+            print(
+                f"{name:<14} {label:<10} {r['rows']:6d} rows  p50 {r['p50_ms']:8.1f} ms"
+                f"  peak {r['peak_mb']:7.1f} MB"
+            )
+        print(
+            f"{'':<14} {'speedup':<10} {before['p50_ms'] / after['p50_ms']:6.1f}x"
+            f"  peak memory {before['peak_mb'] / max(after['peak_mb'], 1e-9):6.1f}x less"
+        )
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="empty scratch database (default: SQLite in a temp dir)")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--config-kb", type=int, default=2, help="size of each project's config and files JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="list-serialization-")
+    sys.path.insert(0, os.getcwd())
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{workdir}/lists.sqlite"
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    if "ENCRYPTION_KEY" not in os.environ:
+        from cryptography.fernet import Fernet
+        os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark: event-loop lag during a login storm, bcrypt inline vs. worker pool.
+
+Run from ``backend/``::
+
+    python -m benchmarks.login_storm --logins 40 --concurrency 20 --rounds 12
+
+Each login is one bcrypt verify at ``--rounds``. "inline" calls passlib on
+the event loop the way ``authenticate_user`` used to; "pool" awaits
+``PasswordHasher`` with ``--workers`` threads and a ``--max-queue`` wait
+queue (logins beyond it are rejected, as the API would answer 503). A probe
+task measures how late a 10 ms sleep wakes up meanwhile: that lag is what
+every in-flight stream on the same worker sees.
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.security.passwords import PasswordHasher, PasswordHasherBusy, make_context
+from benchmarks.e2e import LagProbe, summarize
+
+
+async def storm(args, verify) -> dict:
+    probe = LagProbe()
+    probe_task = asyncio.create_task(probe.run())
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies, rejected = [], 0
+
+    async def login() -> None:
+        nonlocal rejected
+        async with sem:
+            t0 = time.perf_counter()
+            await asyncio.sleep(0)  # stands in for the user SELECT before the verify
+            try:
+                await verify()
+            except PasswordHasherBusy:
+                rejected += 1
+                return
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.sleep(0.05)  # let the probe take a few idle samples
+    t0 = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - t0
+    await asyncio.sleep(probe.interval * 2)  # let the probe record a stall that just ended
+    probe_task.cancel()
+    await asyncio.gather(probe_task, return_exceptions=True)
+    return {
+        "logins_per_s": len(latencies) / elapsed,
+        "login": summarize(latencies),
+        "lag": summarize(probe.samples),
+        "rejected": rejected,
+    }
+
+
+async def main(args) -> None:
+    context = make_context(args.rounds)
+    hashed = context.hash("correct horse battery staple")
+
+    async def inline() -> None:
+        context.verify("correct horse battery staple", hashed)
+
+    hasher = PasswordHasher(context, args.workers, args.max_queue)
+
+    async def pooled() -> None:
+        await hasher.verify("correct horse battery staple", hashed)
+
+    try:
+        for name, verify in (("inline", inline), ("pool", pooled)):
+            r = await storm(args, verify)
+            login, lag = r["login"], r["lag"]
+            print(
+                f"{name:<7} {r['logins_per_s']:6.1f} logins/s  login p50 {login.get('p50_ms', 0):7.1f}"
+                f"  p99 {login.get('p99_ms', 0):7.1f} ms  loop lag p50 {lag.get('p50_ms', 0):7.1f}"
+                f"  p99 {lag.get('p99_ms', 0):7.1f}  max {lag.get('max_ms', 0):7.1f} ms  rejected {r['rejected']}"
+            )
+    finally:
+        hasher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-queue", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""Benchmark: semantic cache lookup latency at 100k entries.
+
+Run from ``backend/``::
+
+    python -m benchmarks.semantic_cache --entries 100000 --dim 256
+
+Measures embedding and vectorized top-k search separately, for a single
+global scope (every row scored) and for per-user scopes (only the caller's
+rows scored), and prints similarity for a few near-duplicate prompts.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.core.ai.semantic_cache import SemanticIndex, embed
+
+PAIRS = [
+    ("write a telegram bot that sends the weather every morning",
+     "Write a Telegram bot that sends weather every morning"),
+    ("write a telegram bot that sends the weather every morning",
+     "write a telegram bot that sends currency rates every morning"),
+    ("write a telegram bot that sends the weather every morning",
+     "explain how postgres partitioning works"),
+]
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def fill(index: SemanticIndex, entries: int, scopes: int, rng) -> None:
+    vectors = rng.standard_normal((entries, index.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for i in range(entries):
+        index.add(vectors[i], f"user:{i % scopes}", f"answer {i}")
+
+
+def main(args) -> None:
+    rng = np.random.default_rng(0)
+    query = embed(PAIRS[0][0], args.dim)
+
+    print(f"embed: {timed(lambda: embed(PAIRS[0][0], args.dim), 200):.3f} ms")
+    for scopes in (1, args.users):
+        index = SemanticIndex(args.entries, args.dim)
+        fill(index, args.entries, scopes, rng)
+        scope = "user:0"
+        ms = timed(lambda: index.search(query, scope, k=args.k), args.repeat)
+        label = "global scope" if scopes == 1 else f"{scopes} user scopes"
+        print(f"search top-{args.k}, {args.entries} entries, {label}: {ms:.3f} ms")
+
+    for a, b in PAIRS:
+        sim = float(embed(a, args.dim) @ embed(b, args.dim))
+        print(f"{sim:.3f}  {a!r} ~ {b!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,111 @@
+"""Local OpenAI-compatible stand-in server for benchmarks.
+
+Serves ``POST /v1/chat/completions`` (plain JSON or SSE with ``stream: true``)
+with a fixed reply after an optional delay, so client-side overhead can be
+measured without a real provider.
+"""
+import asyncio
+import datetime
+import json
+import os
+import ssl
+import tempfile
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+
+def _completion(model: str, text: str) -> dict:
+    return {
+        "id": "chatcmpl-standin",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 8, "completion_tokens": 8, "total_tokens": 16},
+    }
+
+
+def _chunk(model: str, content: Optional[str] = None, finish_reason: Optional[str] = None) -> bytes:
+    delta = {"content": content} if content is not None else {}
+    chunk = {
+        "id": "chatcmpl-standin",
+        "object": "chat.completion.chunk",
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+def make_app(delay_ms: float = 0.0, reply: str = "ok", token_interval_ms: float = 0.0) -> web.Application:
+    """Stand-in app. ``delay_ms`` is time to first token; with ``stream: true``
+    the reply is sent word by word, ``token_interval_ms`` apart."""
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "standin")
+        tokens = reply.split(" ")
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        if not body.get("stream"):
+            if token_interval_ms:
+                await asyncio.sleep(token_interval_ms * (len(tokens) - 1) / 1000)
+            return web.json_response(_completion(model, reply))
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        for i, token in enumerate(tokens):
+            if i and token_interval_ms:
+                await asyncio.sleep(token_interval_ms / 1000)
+            await resp.write(_chunk(model, token if i == 0 else " " + token))
+        await resp.write(_chunk(model, finish_reason="stop"))
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+def self_signed_context() -> Tuple[ssl.SSLContext, ssl.SSLContext]:
+    """Return (server, client) SSL contexts for a throwaway localhost cert."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    tmp = tempfile.mkdtemp()
+    cert_path, key_path = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+    server_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_ctx.load_cert_chain(cert_path, key_path)
+    client_ctx = ssl.create_default_context(cafile=cert_path)
+    return server_ctx, client_ctx
+
+
+async def start(app: web.Application, port: int = 0, ssl_context: Optional[ssl.SSLContext] = None) -> Tuple[web.AppRunner, str]:
+    """Start ``app`` on localhost and return (runner, base_url)."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", port, ssl_context=ssl_context)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    scheme = "https" if ssl_context else "http"
+    return runner, f"{scheme}://localhost:{bound_port}/v1"
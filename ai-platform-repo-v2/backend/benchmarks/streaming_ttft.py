@@ -0,0 +1,50 @@
+"""Benchmark: time-to-first-token, buffered completion vs. SSE streaming.
+
+Run from ``backend/``::
+
+    python -m benchmarks.streaming_ttft --tokens 200 --token-interval-ms 20
+
+Both strategies hit the local stand-in with the same per-token pacing;
+the buffered one can only yield after the last token, the streamed one
+yields as soon as the first SSE chunk arrives.
+"""
+import argparse
+import asyncio
+import time
+
+import app.core.ai.manager as manager
+from benchmarks import standin
+
+
+async def main(args) -> None:
+    reply = " ".join(f"tok{i}" for i in range(args.tokens))
+    runner, base = await standin.start(standin.make_app(delay_ms=args.ttft_ms, reply=reply, token_interval_ms=args.token_interval_ms))
+    manager.OPENAI_COMPAT["groq"] = base
+    manager.GROQ_BASE = base
+    ai = manager.AIManager()
+    ai.global_keys["groq"] = "bench"
+    try:
+        t0 = time.perf_counter()
+        text = (await ai.generate("ping", provider="groq")).text
+        buffered = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        first = None
+        async for _ in ai.stream_generate("ping", provider="groq"):
+            if first is None:
+                first = (time.perf_counter() - t0) * 1000
+        total = (time.perf_counter() - t0) * 1000
+    finally:
+        await manager.upstream.aclose()
+        await runner.cleanup()
+
+    print(f"buffered generate: first text after {buffered:.1f} ms ({len(text.split())} tokens)")
+    print(f"SSE stream:        first token after {first:.1f} ms, last after {total:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--ttft-ms", type=float, default=30.0)
+    parser.add_argument("--token-interval-ms", type=float, default=20.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""Benchmark: fresh httpx client per call vs. the shared upstream pool.
+
+Run from ``backend/``::
+
+    python -m benchmarks.upstream_pool --requests 500 --concurrency 10 --tls
+
+Prints p50/p99 latency and throughput for both strategies against the
+local stand-in server.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from app.core.ai.http import UpstreamClients
+from benchmarks import standin
+
+PAYLOAD = {"model": "standin", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 8}
+HEADERS = {"Authorization": "Bearer bench", "Content-Type": "application/json"}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+async def run(call, total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies),
+        "rps": total / elapsed,
+    }
+
+
+async def main(args) -> None:
+    server_ctx = client_ctx = None
+    if args.tls:
+        server_ctx, client_ctx = standin.self_signed_context()
+    runner, base = await standin.start(standin.make_app(delay_ms=args.delay_ms), ssl_context=server_ctx)
+    url = f"{base}/chat/completions"
+    verify = client_ctx if client_ctx else True
+
+    async def fresh_client():
+        async with httpx.AsyncClient(timeout=90, verify=verify) as client:
+            r = await client.post(url, headers=HEADERS, json=PAYLOAD)
+            r.raise_for_status()
+
+    pool = UpstreamClients(verify=verify)
+
+    async def pooled():
+        r = await pool.get(base).post(url, headers=HEADERS, json=PAYLOAD)
+        r.raise_for_status()
+
+    try:
+        # Warm-up so one-off import and pool setup costs are not measured.
+        await run(pooled, min(20, args.requests), args.concurrency)
+        results = {
+            "fresh_client_per_call": await run(fresh_client, args.requests, args.concurrency),
+            "pooled_client": await run(pooled, args.requests, args.concurrency),
+        }
+    finally:
+        await pool.aclose()
+        await runner.cleanup()
+
+    print(f"{'strategy':<24}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['mean_ms']:>10.2f}{r['rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="simulated upstream processing time")
+    parser.add_argument("--tls", action="store_true", help="serve the stand-in over HTTPS with a self-signed cert")
+    asyncio.run(main(parser.parse_args()))
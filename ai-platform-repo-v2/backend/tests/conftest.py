@@ -0,0 +1,46 @@
+"""Test settings: SQLite primary and replica files in a temp dir, no Redis, cheap bcrypt.
+
+Set before ``app`` is imported, since the engines are built from settings at import.
+The ``client`` fixture talks to the ASGI app in-process (no lifespan: background
+tasks stay off).
+"""
+import os
+import tempfile
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+
+_tmp = tempfile.mkdtemp(prefix="ai-platform-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp}/primary.sqlite"
+os.environ["DATABASE_REPLICA_URLS"] = f"sqlite+aiosqlite:///{_tmp}/replica.sqlite"
+os.environ["REDIS_ENABLED"] = "false"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.makedirs(f"{_tmp}/static", exist_ok=True)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def asgi_app(monkeypatch):
+    monkeypatch.chdir(_tmp)  # app.main mounts ./static at import
+    from app.main import app
+
+    yield app
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+async def client(asgi_app):
+    from app.core.database import engine, init_db, replicas
+
+    await init_db()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://test") as c:
+        yield c
+    await engine.dispose()
+    for e in replicas.engines:
+        await e.dispose()
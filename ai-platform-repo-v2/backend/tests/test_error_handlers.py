@@ -0,0 +1,34 @@
+import pytest
+
+from app.api.v1 import generate as generate_module
+from app.api.v1.deps import get_token_user
+from app.core.ai.errors import DeadlineExceeded, RateLimited, UpstreamError
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def failing_generate(asgi_app, monkeypatch):
+    asgi_app.dependency_overrides[get_token_user] = lambda: {"id": 1, "is_admin": False}
+
+    def fail_with(exc):
+        async def generate(**kwargs):
+            raise exc
+        monkeypatch.setattr(generate_module.ai_manager, "generate", generate)
+
+    return fail_with
+
+
+@pytest.mark.parametrize("exc, status", [
+    (UpstreamError("openai", 503, "overloaded"), 503),
+    (UpstreamError("openai", 500, "boom"), 500),
+    (UpstreamError("openai", None, "connection reset"), 502),
+    (UpstreamError("openai", 401, "invalid api key"), 502),
+    (RateLimited("openai", "slow down", retry_after=3), 429),
+    (DeadlineExceeded("openai"), 504),
+])
+async def test_upstream_errors_become_json_responses(client, failing_generate, exc, status):
+    failing_generate(exc)
+    r = await client.post("/api/v1/ai/generate", json={"prompt": "hi"})
+    assert r.status_code == status
+    assert "openai" in r.json()["detail"]
@@ -0,0 +1,43 @@
+"""No ``Database`` query may fall back to a full table scan (SQLite plans).
+
+The same probes as ``benchmarks/explain_plans.py``, which remains the
+manual run against Postgres.
+"""
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core import database
+from app.core.database import Database, init_db
+from app.core.db_pool import make_engine
+from benchmarks.explain_plans import explain_probes, probes, seed, unexpected_scans
+
+pytestmark = pytest.mark.anyio
+
+USERS = 300
+
+
+@pytest.fixture
+async def plans_engine(tmp_path, monkeypatch):
+    """A seeded scratch database of its own, with reads kept off the replicas."""
+    eng = make_engine(f"sqlite+aiosqlite:///{tmp_path}/plans.sqlite")
+    monkeypatch.setattr(database, "engine", eng)
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessionmaker(eng, class_=AsyncSession, expire_on_commit=False))
+    monkeypatch.setattr(database.replicas, "healthy", [False] * len(database.replicas.engines))
+    await init_db()
+    await seed(eng, USERS, 5)
+    yield eng
+    await eng.dispose()
+
+
+async def test_indexed_paths_do_not_scan(plans_engine):
+    calls = probes(Database(), USERS)
+    results = await explain_probes(plans_engine, calls)
+
+    assert {name for name, *_ in results} == {name for name, _ in calls}, "a probe sent no SQL to the primary"
+    regressions = [
+        f"{name}: full scan of {', '.join(unexpected)}\n  {' '.join(statement.split())}"
+        for name, statement, _, scans in results
+        if (unexpected := unexpected_scans(name, scans))
+    ]
+    assert not regressions, "\n".join(regressions)
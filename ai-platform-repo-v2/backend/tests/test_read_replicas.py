@@ -0,0 +1,79 @@
+import shutil
+from itertools import count
+
+import pytest
+
+from app.core import database
+from app.core.database import Database, engine, init_db, recent_writes, replicas
+
+pytestmark = pytest.mark.anyio
+
+_ids = count()
+
+
+def _path(url: str) -> str:
+    return url.split(":///", 1)[1]
+
+
+@pytest.fixture
+async def db():
+    await init_db()
+    recent_writes._cache.clear()
+    yield Database()
+    await engine.dispose()
+    for e in replicas.engines:
+        await e.dispose()
+
+
+async def _freeze_replica() -> None:
+    """Copy the primary into the replica file: a replica that stops replicating from here on."""
+    await engine.dispose()
+    for e in replicas.engines:
+        await e.dispose()
+    shutil.copy(_path(database.ASYNC_DB_URL), _path(replicas.urls[0]))
+    await replicas.check()
+    assert replicas.healthy == [True]
+
+
+async def _user_with_project(db: Database):
+    uid = await db.create_user(f"replica{next(_ids)}@example.com", "pw")
+    pid = await db.create_project(uid, {"name": "p"})
+    return uid, pid
+
+
+async def test_reads_go_to_the_replica_outside_the_window(db):
+    uid, pid = await _user_with_project(db)
+    await _freeze_replica()
+    await db.update_project(pid, {"status": "ready"})
+    recent_writes._cache.clear()  # window over
+    assert [p["status"] for p in await db.list_projects(uid)] == ["draft"]
+
+
+async def test_write_then_read_routes_to_the_primary(db):
+    uid, pid = await _user_with_project(db)
+    await _freeze_replica()
+
+    await db.update_project(pid, {"status": "ready"})
+    assert [p["status"] for p in await db.list_projects(uid)] == ["ready"]
+
+    recent_writes._cache.clear()
+    await db.create_project(uid, {"name": "second"})
+    assert [p["name"] for p in await db.list_projects(uid)] == ["second", "p"]
+
+    recent_writes._cache.clear()
+    await db.add_log(pid, "info", "built")
+    assert recent_writes.get(uid) is True
+
+    recent_writes._cache.clear()
+    tid = await db.create_thread(uid, pid, "t")
+    await db.add_message(uid, tid, "user", "hi")
+    assert [m["content"] for m in await db.list_messages(uid, tid)] == ["hi"]
+
+
+async def test_unhealthy_replica_falls_back_to_the_primary(db):
+    uid, pid = await _user_with_project(db)
+    await _freeze_replica()
+    await db.update_project(pid, {"status": "ready"})
+    recent_writes._cache.clear()
+    replicas.mark_down(0, "test")
+    assert [p["status"] for p in await db.list_projects(uid)] == ["ready"]
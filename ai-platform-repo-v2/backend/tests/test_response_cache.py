@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import cache as cache_module
+from app.core.ai import manager as manager_module
+from app.core.ai import response_cache as response_cache_module
+from app.core.ai.response_cache import ResponseCache, is_cacheable, request_key
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class StubRedis:
+    """The slice of redis.asyncio the cache uses: GET / SET with EX, on a shared clock."""
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.data = {}
+        self.fail = False
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        item = self.data.get(key)
+        if item is None or (item[1] is not None and item[1] <= self.clock.now):
+            return None
+        return item[0]
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = (value.encode(), None if ex is None else self.clock.now + ex)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def redis(monkeypatch, clock):
+    stub = StubRedis(clock)
+    monkeypatch.setattr(response_cache_module, "get_redis", lambda: stub)
+    return stub
+
+
+KEY = request_key("mock", "mock-1", "2+2?", 0, 16, False)
+
+
+async def test_miss_then_hit(redis):
+    cache = ResponseCache()
+    assert await cache.get(KEY) is None
+    await cache.set(KEY, "4")
+    assert await cache.get(KEY) == "4"
+    assert redis.data[settings.AI_CACHE_REDIS_PREFIX + KEY][0] == b"4"
+
+
+async def test_l2_hit_from_another_worker(redis):
+    await ResponseCache().set(KEY, "4")
+    other = ResponseCache()  # empty L1, same Redis
+    assert await other.get(KEY) == "4"
+    redis.data.clear()
+    assert await other.get(KEY) == "4"  # promoted to its L1
+
+
+async def test_entries_expire_after_ttl(redis, clock):
+    cache = ResponseCache()
+    await cache.set(KEY, "4")
+    clock.now += settings.AI_CACHE_TTL - 1
+    assert await cache.get(KEY) == "4"
+    clock.now += 2
+    assert await cache.get(KEY) is None
+    assert await ResponseCache().get(KEY) is None
+
+
+async def test_redis_errors_degrade_to_l1(redis):
+    redis.fail = True
+    cache = ResponseCache()
+    await cache.set(KEY, "4")
+    assert await cache.get(KEY) == "4"
+    assert await cache.get(request_key("mock", "mock-1", "other", 0, 16, False)) is None
+
+
+def test_key_covers_every_parameter():
+    assert KEY != request_key("mock", "mock-1", "2+2?", 0, 17, False)
+    assert KEY != request_key("mock", "mock-1", "2+2?", 0.1, 16, False)
+    assert KEY != request_key("mock", "mock-1", "2+2?", 0, 16, True)
+
+
+def test_only_deterministic_requests_are_cacheable():
+    assert is_cacheable(0, False)
+    assert is_cacheable(0.7, True)  # JSON mode
+    assert not is_cacheable(0.7, False)
+
+
+@pytest.mark.parametrize("temperature, second_cached", [(0, True), (0.7, False)])
+async def test_generate_bypasses_the_cache_for_sampled_requests(monkeypatch, redis, temperature, second_cached):
+    monkeypatch.setattr(settings, "AI_MOCK_ENABLED", True)
+    monkeypatch.setattr(settings, "AI_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "AI_SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(manager_module, "response_cache", ResponseCache())
+    ai = manager_module.AIManager()
+    prompt = f"cache test at temperature {temperature}"
+    first = await ai.generate(prompt, provider="mock", temperature=temperature, max_tokens=16)
+    second = await ai.generate(prompt, provider="mock", temperature=temperature, max_tokens=16)
+    assert not first.cached
+    assert second.cached is second_cached
+    assert second.text == first.text
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.ai.errors import DeadlineExceeded, UpstreamError
+from app.core.ai.retry import stream_with_retries
+
+pytestmark = pytest.mark.anyio
+
+
+async def _collect(agen):
+    return [chunk async for chunk in agen]
+
+
+async def test_stream_stalled_mid_way_hits_the_deadline():
+    async def stalls():
+        yield "a"
+        await asyncio.sleep(10)
+        yield "b"
+
+    got = []
+    t0 = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        async for chunk in stream_with_retries("mock", stalls, deadline=time.monotonic() + 0.2):
+            got.append(chunk)
+    assert got == ["a"]
+    assert time.monotonic() - t0 < 1
+
+
+async def test_stream_retried_before_first_chunk():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise UpstreamError("mock", 503, "busy")
+        yield "ok"
+
+    assert await _collect(stream_with_retries("mock", flaky, deadline=time.monotonic() + 5)) == ["ok"]
+    assert len(attempts) == 2
+
+
+async def test_stream_without_deadline_runs_to_completion():
+    async def chunks():
+        for c in "abc":
+            yield c
+
+    assert await _collect(stream_with_retries("mock", chunks)) == ["a", "b", "c"]
@@ -0,0 +1,52 @@
+import pytest
+
+from app.core.ai import manager as manager_module
+from app.core.ai.errors import UpstreamError
+from app.core.ai.manager import AIManager
+from app.core.ai.router import ProviderRouter
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def fresh_router(monkeypatch):
+    r = ProviderRouter(failure_threshold=3)
+    monkeypatch.setattr(manager_module, "router", r)
+    return r
+
+
+def _failing(status):
+    async def call(self, *args):
+        raise UpstreamError("mock", status, "nope")
+    return call
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+async def test_caller_errors_leave_the_circuit_closed(monkeypatch, fresh_router, status):
+    monkeypatch.setattr(AIManager, "_call_mock", _failing(status))
+    ai = AIManager()
+    for _ in range(10):
+        with pytest.raises(UpstreamError):
+            await ai._complete("mock", "hi", "mock-model", 0.0, 8, "sk-test", False)
+    assert fresh_router.available("mock", "mock-model")
+    assert fresh_router.expected_latency("mock", "mock-model") == 0.0
+
+
+@pytest.mark.parametrize("status", [500, 503, None])
+async def test_upstream_failures_open_the_circuit(monkeypatch, fresh_router, status):
+    monkeypatch.setattr(AIManager, "_call_mock", _failing(status))
+    ai = AIManager()
+    for _ in range(3):
+        with pytest.raises(UpstreamError):
+            await ai._complete("mock", "hi", "mock-model", 0.0, 8, "sk-test", False)
+    assert not fresh_router.available("mock", "mock-model")
+
+
+async def test_caller_error_frees_the_half_open_probe(monkeypatch, fresh_router):
+    fresh_router.cooldown = 0.0
+    for _ in range(3):
+        fresh_router.record_failure("mock", "mock-model", 1.0)
+    monkeypatch.setattr(AIManager, "_call_mock", _failing(401))
+    with pytest.raises(UpstreamError):
+        await AIManager()._complete("mock", "hi", "mock-model", 0.0, 8, "sk-test", False)
+    assert fresh_router.available("mock", "mock-model")
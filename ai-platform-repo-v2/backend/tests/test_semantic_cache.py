@@ -0,0 +1,28 @@
+import numpy as np
+
+from app.core.ai import semantic_cache
+from app.core.ai.semantic_cache import SemanticIndex, embed, scope_id
+
+
+def test_scope_id_is_64_bit():
+    ids = {scope_id(f"user:{i}|openai|gpt-4o-mini|0") for i in range(100_000)}
+    assert len(ids) == 100_000
+    assert any(not -2**31 <= i < 2**31 for i in ids)
+
+
+def test_hit_is_scoped():
+    index = SemanticIndex(16, 64)
+    vec = embed("what is the capital of france", 64)
+    index.add(vec, "user:1|openai|m|0", "paris")
+    assert [a for _, a in index.search(vec, "user:1|openai|m|0")] == ["paris"]
+    assert index.search(vec, "user:2|openai|m|0") == []
+
+
+def test_colliding_scope_ids_do_not_leak_answers(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "scope_id", lambda scope: 42)
+    index = SemanticIndex(16, 64)
+    vec = embed("my account balance", 64)
+    index.add(vec, "user:1|openai|m|0", "user 1's answer")
+    assert index.search(vec, "user:2|openai|m|0") == []
+    assert [a for _, a in index.search(vec, "user:1|openai|m|0")] == ["user 1's answer"]
+    assert np.count_nonzero(index._scopes[:len(index)] == 42) == 1
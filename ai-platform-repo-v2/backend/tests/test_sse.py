@@ -0,0 +1,61 @@
+import json
+
+import httpx
+import pytest
+
+from app.core.ai.sse import iter_chat_deltas
+
+pytestmark = pytest.mark.anyio
+
+
+def chunk(content: str) -> str:
+    return json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+async def deltas(*parts: bytes):
+    async def body():
+        for part in parts:
+            yield part
+
+    return [d async for d in iter_chat_deltas(httpx.Response(200, content=body()))]
+
+
+HELLO = f"data: {chunk('Hel')}\n\ndata: {chunk('lo')}\n\ndata: [DONE]\n\n".encode()
+CRLF = HELLO.replace(b"\n", b"\r\n")
+RU = f"data: {json.dumps({'choices': [{'delta': {'content': 'привет'}}]}, ensure_ascii=False)}\n\n".encode()
+
+CASES = {
+    "plain": ([HELLO], ["Hel", "lo"]),
+    "done stops the stream": (
+        [f"data: {chunk('a')}\n\ndata: [DONE]\n\ndata: {chunk('after')}\n\n".encode()],
+        ["a"],
+    ),
+    "no done, stream just ends": ([f"data: {chunk('a')}\n\ndata: {chunk('b')}".encode()], ["a", "b"]),
+    "multi-line data event": (
+        [b'data: {"choices": [{"delta":\ndata:  {"content": "joined"}}]}\n\ndata: [DONE]\n\n'],
+        ["joined"],
+    ),
+    "comments and keep-alives": (
+        [f": keep-alive\n\n:\ndata: {chunk('a')}\n\n: ping\n\ndata: [DONE]\n\n".encode()],
+        ["a"],
+    ),
+    "other fields ignored": (
+        [f"event: delta\nid: 1\nretry: 100\ndata: {chunk('a')}\n\ndata: [DONE]\n\n".encode()],
+        ["a"],
+    ),
+    "no space after colon": ([f"data:{chunk('a')}\n\ndata:[DONE]\n\n".encode()], ["a"]),
+    "crlf": ([CRLF], ["Hel", "lo"]),
+    "split inside a line": ([HELLO[:9], HELLO[9:40], HELLO[40:]], ["Hel", "lo"]),
+    "split between cr and lf": ([CRLF[:CRLF.index(b"\r") + 1], CRLF[CRLF.index(b"\r") + 1:]], ["Hel", "lo"]),
+    "one byte at a time": ([HELLO[i:i + 1] for i in range(len(HELLO))], ["Hel", "lo"]),
+    "empty data and empty choices skipped": (
+        [b'data:\n\ndata: {"choices": []}\n\n' + f"data: {chunk('a')}\n\n".encode() + b'data: {"choices": [{"delta": {}}]}\n\n'],
+        ["a"],
+    ),
+    "utf-8 character split across chunks": ([RU[:RU.index("п".encode()) + 1], RU[RU.index("п".encode()) + 1:]], ["привет"]),
+}
+
+
+@pytest.mark.parametrize("parts, expected", list(CASES.values()), ids=list(CASES))
+async def test_iter_chat_deltas(parts, expected):
+    assert await deltas(*parts) == expected
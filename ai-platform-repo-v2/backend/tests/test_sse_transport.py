@@ -0,0 +1,88 @@
+"""SSE parsing over a real local connection through the pooled upstream client.
+
+The stand-in server (aiohttp, ``benchmarks.standin``) writes each event in
+pieces with a flush in between, so chunk boundaries fall wherever TCP puts
+them rather than where a test hand-cut the bytes.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from aiohttp import web
+
+from app.core.ai.http import UpstreamClients
+from app.core.ai.sse import iter_chat_deltas
+from benchmarks.standin import start
+
+pytestmark = pytest.mark.anyio
+
+WORDS = ["при", "вет", ",", " мир"]
+
+
+def _event(content: str) -> bytes:
+    return f"data: {json.dumps({'choices': [{'delta': {'content': content}}]}, ensure_ascii=False)}\n\n".encode()
+
+
+@pytest.fixture
+async def server():
+    peers = []
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        peers.append(request.transport.get_extra_info("peername"))
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await resp.write(b": keep-alive\r\n\r\n")
+        for i, word in enumerate(WORDS):
+            event = _event(word).replace(b"\n", b"\r\n")
+            for j in range(0, len(event), 5):  # 5-byte writes: cuts inside CRLF and UTF-8 characters
+                await resp.write(event[j:j + 5])
+                await asyncio.sleep(0)
+            if body.get("abort_after") == i + 1:
+                request.transport.close()  # provider drops the connection mid-stream
+                return resp
+        await resp.write(b"data: [DONE]\r\n\r\n")
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    runner, base = await start(app)
+    clients = UpstreamClients()
+    yield clients.get(base), base, peers
+    await clients.aclose()
+    await runner.cleanup()
+
+
+async def _stream(client, base, **body):
+    async with client.stream("POST", f"{base}/chat/completions", json=body) as resp:
+        assert resp.status_code == 200
+        return [d async for d in iter_chat_deltas(resp)]
+
+
+async def test_streams_share_one_pooled_connection(server):
+    client, base, peers = server
+    for _ in range(3):
+        assert await _stream(client, base) == WORDS
+    assert len(peers) == 3 and len(set(peers)) == 1
+
+
+async def test_connection_dropped_mid_stream_raises_after_the_deltas_so_far(server):
+    client, base, peers = server
+    got = []
+    with pytest.raises(httpx.TransportError):
+        async with client.stream("POST", f"{base}/chat/completions", json={"abort_after": 2}) as resp:
+            async for delta in iter_chat_deltas(resp):
+                got.append(delta)
+    assert got == WORDS[:2]
+    assert await _stream(client, base) == WORDS  # the pool replaced the dead connection
+
+
+async def test_reader_stopping_early_leaves_the_pool_usable(server):
+    client, base, peers = server
+    async with client.stream("POST", f"{base}/chat/completions", json={}) as resp:
+        async for delta in iter_chat_deltas(resp):
+            break
+    assert delta == WORDS[0]
+    assert await _stream(client, base) == WORDS
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from itertools import count
+
+import pytest
+
+from app.core import database
+from app.core.database import Database, _flush_usage
+from app.core.security.auth import create_jwt
+from app.core.security.user_cache import user_cache
+
+pytestmark = pytest.mark.anyio
+
+_ids = count()
+
+
+@pytest.fixture
+async def me(client, monkeypatch):
+    user_cache._cache.clear()
+    uid = await Database().create_user(f"me{next(_ids)}@example.com", "pw")
+    lookups = []
+    get_user = Database.get_user
+
+    async def counted(self, user_id):
+        lookups.append(user_id)
+        return await get_user(self, user_id)
+
+    monkeypatch.setattr(Database, "get_user", counted)
+    headers = {"Authorization": f"Bearer {create_jwt(uid)}"}
+
+    async def fetch():
+        r = await client.get("/api/v1/users/me", headers=headers)
+        assert r.status_code == 200
+        return r.json()
+
+    return uid, headers, lookups, fetch
+
+
+async def test_me_is_served_from_the_user_cache(me):
+    uid, _, lookups, fetch = me
+    for _ in range(3):
+        assert (await fetch())["id"] == uid
+    assert lookups == [uid]
+
+
+async def test_me_reflects_settings_updates(client, me):
+    uid, headers, lookups, fetch = me
+    await fetch()
+    r = await client.put("/api/v1/users/me/settings", json={"theme": "dark"}, headers=headers)
+    assert r.status_code == 200
+    assert (await fetch())["settings"] == {"theme": "dark"}
+
+
+async def test_me_reflects_flushed_usage(me, monkeypatch):
+    uid, _, lookups, fetch = me
+    monkeypatch.setattr(database.replicas, "healthy", [False] * len(database.replicas.engines))
+    assert (await fetch())["total_tokens"] == 0
+    await _flush_usage([{
+        "user_id": uid, "provider": "mock", "tokens_used": 42, "cost_estimate": 0.0,
+        "endpoint": "/ai/generate", "created_at": datetime.now(timezone.utc),
+    }])
+    assert (await fetch())["total_tokens"] == 42
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.writebehind import AppendBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+def _buffer(spool_path, sink=None):
+    async def flush(batch):
+        if sink is None:
+            raise ConnectionError("database down")
+        sink.extend(batch)
+
+    return AppendBuffer("usage-test", flush, interval=60, batch_size=10, max_size=100, put_timeout=0.1,
+                        spool_path=str(spool_path))
+
+
+def _rows(worker, n):
+    at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    return [{"worker": worker, "n": i, "created_at": at} for i in range(n)]
+
+
+async def test_unflushed_rows_are_spooled_and_replayed(tmp_path):
+    spool = tmp_path / "usage_spool.jsonl"
+    down = _buffer(spool)
+    for row in _rows("a", 3):
+        await down.put(row)
+    await down.stop(attempts=1)
+    assert len(down) == 0
+
+    written = []
+    up = _buffer(spool, written)
+    up.start()
+    await up.stop()
+    assert written == _rows("a", 3)  # datetimes survive the round trip
+    assert os.listdir(tmp_path) == []
+
+
+async def test_workers_stopping_together_do_not_clobber_each_other(tmp_path):
+    spool = tmp_path / "usage_spool.jsonl"
+    for worker in ("a", "b"):
+        buf = _buffer(spool)
+        for row in _rows(worker, 2):
+            await buf.put(row)
+        await buf.stop(attempts=1)
+
+    written = []
+    up = _buffer(spool, written)
+    up.start()
+    await up.stop()
+    assert sorted((r["worker"], r["n"]) for r in written) == [("a", 0), ("a", 1), ("b", 0), ("b", 1)]
+
+
+async def test_a_spool_file_is_replayed_by_one_worker_only(tmp_path, monkeypatch):
+    spool = tmp_path / "usage_spool.jsonl"
+    buf = _buffer(spool)
+    for row in _rows("a", 3):
+        await buf.put(row)
+    await buf.stop(attempts=1)
+
+    # Two workers list the spool files before either claims one.
+    first, second = _buffer(spool), _buffer(spool)
+    listed = second._spool_files()
+    monkeypatch.setattr(second, "_spool_files", lambda: listed)
+    first._replay_spool()
+    second._replay_spool()
+    assert len(first) + len(second) == 3
+
+
+async def test_legacy_shared_spool_file_is_replayed(tmp_path):
+    spool = tmp_path / "usage_spool.jsonl"
+    spool.write_text('{"worker": "old", "n": 0}\n', encoding="utf-8")
+    buf = _buffer(spool)
+    buf._replay_spool()
+    assert len(buf) == 1 and not spool.exists()
@@ -0,0 +1,68 @@
+import pytest
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.v1 import generate as generate_module
+from app.core.ai.errors import UpstreamError
+from app.core.config import settings
+from app.core.security.auth import create_jwt
+
+
+@pytest.fixture
+def ws(asgi_app, monkeypatch):
+    monkeypatch.setattr(settings, "JWT_EMBED_FLAGS", True)  # identity from the token alone
+    billed = []
+
+    async def add_usage(**row):
+        billed.append(row)
+
+    monkeypatch.setattr(generate_module.db, "add_usage", add_usage)
+
+    def stream_with(*chunks, fail=False):
+        async def stream_generate(prompt, provider=None, **kwargs):
+            for chunk in chunks:
+                yield chunk
+            if fail:
+                raise UpstreamError("openai", None, "connection reset")
+        monkeypatch.setattr(generate_module.ai_manager, "stream_generate", stream_generate)
+
+    return TestClient(asgi_app), stream_with, billed
+
+
+def _receive_all(conn):
+    got = []
+    try:
+        while True:
+            got.append(conn.receive_text())
+    except WebSocketDisconnect:
+        return got
+
+
+def test_finished_stream_is_billed_to_the_token_user(ws):
+    client, stream_with, billed = ws
+    stream_with("Hel", "lo")
+    with client.websocket_connect(f"/api/v1/ai/stream?token={create_jwt(7)}") as conn:
+        conn.send_json({"prompt": "hi", "provider": "openai"})
+        assert [conn.receive_text() for _ in range(3)] == ["Hel", "lo", "[DONE]"]
+    assert [(b["user_id"], b["endpoint"]) for b in billed] == [(7, "/ai/stream")]
+
+
+def test_stream_failing_mid_way_bills_the_tokens_already_sent(ws):
+    client, stream_with, billed = ws
+    stream_with("Hel", "lo", fail=True)
+    with client.websocket_connect(f"/api/v1/ai/stream?token={create_jwt(7)}") as conn:
+        conn.send_json({"prompt": "hi", "provider": "openai"})
+        got = _receive_all(conn)
+    assert got[:2] == ["Hel", "lo"] and got[2].startswith("[ERROR]")
+    assert len(billed) == 1 and billed[0]["user_id"] == 7 and billed[0]["tokens"] > 0
+
+
+def test_stream_without_a_token_is_refused(ws):
+    client, stream_with, billed = ws
+    stream_with("never")
+    with client.websocket_connect("/api/v1/ai/stream") as conn:
+        conn.send_json({"prompt": "hi"})
+        with pytest.raises(WebSocketDisconnect) as e:
+            conn.receive_text()
+    assert e.value.code == 1008
+    assert billed == []